@@ -0,0 +1,32 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "databus-snippets")
+
+
+def conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> dict:
+    """Returns the headers for a conditional GET revalidating a response with the given validators"""
+    headers = {}
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    if last_modified is not None:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+class SqliteStore:
+    def __init__(self, filename: str, schema: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        """sqlite database filename in cache_dir, its table is created with the schema statement if missing.
+        Subclasses run their queries on self._conn while holding self._lock, so the store can be shared between threads."""
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, filename)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(schema)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,62 @@
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+from cache_store import DEFAULT_CACHE_DIR, SqliteStore, conditional_headers
+
+
+@dataclass
+class CachedChecksum:
+    """Checksum (and further digests) of a remote file together with the validators it was computed for"""
+
+    etag: Optional[str]
+    last_modified: Optional[str]
+    sha256sum: str
+    byte_size: int
+    digests: dict = field(default_factory=dict)
+
+    def conditional_headers(self) -> dict:
+        """Returns the headers for a conditional GET revalidating this entry"""
+        return conditional_headers(self.etag, self.last_modified)
+
+
+class ChecksumCache(SqliteStore):
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        """On-disk cache mapping file URIs to their ETag, Last-Modified, sha256sum, byte size and further digests.
+        The cache can be shared between threads."""
+        super().__init__(
+            "checksums.sqlite",
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "uri TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "sha256sum TEXT NOT NULL, byte_size INTEGER NOT NULL, digests TEXT)",
+            cache_dir,
+        )
+
+    def get(self, uri: str) -> Optional[CachedChecksum]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, sha256sum, byte_size, digests FROM checksums WHERE uri = ?",
+                (uri,),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, sha256sum, byte_size, digests = row
+        return CachedChecksum(etag, last_modified, sha256sum, byte_size, json.loads(digests or "{}"))
+
+    def put(self, uri: str, entry: CachedChecksum):
+        # without a validator the entry could never be revalidated
+        if entry.etag is None and entry.last_modified is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checksums "
+                "(uri, etag, last_modified, sha256sum, byte_size, digests) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    uri,
+                    entry.etag,
+                    entry.last_modified,
+                    entry.sha256sum,
+                    entry.byte_size,
+                    json.dumps(entry.digests),
+                ),
+            )
@@ -0,0 +1,51 @@
+from array import array
+from typing import Dict, List, Tuple
+
+
+class DuplicateDistributionError(Exception):
+    """Raised if two distributions of a version have the same content variants"""
+
+
+class CVIndex:
+    def __init__(self):
+        """Incremental index over the content variants of the distributions of a version.
+        Distributions are referred to by their position in the version."""
+        self._key_counts: Dict[str, int] = {}
+        self._positions_by_id_string: Dict[str, int] = {}
+        self._postings: Dict[Tuple[str, object], array] = {}
+
+    def add(self, position: int, cvs: dict, id_string: str):
+        """Indexes a distribution, raises DuplicateDistributionError if its id_string is already taken"""
+        other = self._positions_by_id_string.get(id_string)
+        if other is not None:
+            raise DuplicateDistributionError(
+                f"Distributions {other} and {position} have the same content variants: '{id_string}'"
+            )
+        self._positions_by_id_string[id_string] = position
+        for key, value in cvs.items():
+            self._key_counts[key] = self._key_counts.get(key, 0) + 1
+            postings = self._postings.get((key, value))
+            if postings is None:
+                postings = self._postings[(key, value)] = array("Q")
+            postings.append(position)
+
+    @property
+    def keys(self) -> List[str]:
+        """Distinct content variant keys in order of first appearance"""
+        return list(self._key_counts)
+
+    def __contains__(self, id_string: str) -> bool:
+        return id_string in self._positions_by_id_string
+
+    def position_of(self, id_string: str) -> int:
+        return self._positions_by_id_string[id_string]
+
+    def find(self, **cvs) -> List[int]:
+        """Sorted positions of all distributions having all the given content variant values"""
+        if not cvs:
+            return sorted(self._positions_by_id_string.values())
+        postings = sorted((self._postings.get(item, array("Q")) for item in cvs.items()), key=len)
+        result = set(postings[0])
+        for other in postings[1:]:
+            result.intersection_update(other)
+        return sorted(result)
@@ -1,4 +1,3 @@
-import requests
 import json
 import hashlib
 import sys
@@ -6,6 +5,15 @@ from datetime import datetime
 from dataclasses import dataclass, field
 from typing import List
 
+from cv_index import CVIndex
+from databus_auth import get_token_provider
+from http_session import get_session
+
+# size of the chunks in which files are read while hashing
+CHUNK_SIZE = 1024 * 1024
+
+TOKEN_URL = "https://databus.dbpedia.org/auth/realms/databus/protocol/openid-connect/token"
+
 
 @dataclass
 class DataGroup:
@@ -45,16 +53,23 @@ class DataGroup:
 
 
 class DatabusFile:
-    def __init__(self, uri: str, cvs: dict, file_ext: str, **kwargs):
+    def __init__(self, uri: str, cvs: dict, file_ext: str, chunk_size: int = CHUNK_SIZE, **kwargs):
         """Fetches the necessary information of a file URI for the deploy to the databus."""
         self.uri = uri
         self.cvs = cvs
-        resp = requests.get(uri, **kwargs)
-        if resp.status_code > 400:
-            print(f"ERROR for {uri} -> Status {str(resp.status_code)}")
-
-        self.sha256sum = hashlib.sha256(bytes(resp.content)).hexdigest()
-        self.content_length = str(len(resp.content))
+        # stream the file through the hasher so memory usage does not depend on the file size
+        sha256 = hashlib.sha256()
+        content_length = 0
+        with get_session().get(uri, stream=True, **kwargs) as resp:
+            if resp.status_code > 400:
+                print(f"ERROR for {uri} -> Status {str(resp.status_code)}")
+
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                sha256.update(chunk)
+                content_length += len(chunk)
+
+        self.sha256sum = sha256.hexdigest()
+        self.content_length = str(content_length)
         self.file_ext = file_ext
         self.id_string = "_".join([f"{k}={v}" for k, v in cvs.items()]) + "." + file_ext
 
@@ -76,23 +91,31 @@ class DataVersion:
     issued: datetime = field(default_factory=datetime.now)
     context: str = "https://raw.githubusercontent.com/dbpedia/databus-git-mockup/main/dev/context.jsonld"
 
+    def __post_init__(self):
+        # raises DuplicateDistributionError right away instead of a rejected deploy
+        self.cv_index = CVIndex()
+        for position, dbfile in enumerate(self.databus_files):
+            self.cv_index.add(position, dbfile.cvs, dbfile.id_string)
+
+    def add_file(self, dbfile: DatabusFile):
+        """Adds a distribution, raises DuplicateDistributionError if its content variants are already taken"""
+        self.cv_index.add(len(self.databus_files), dbfile.cvs, dbfile.id_string)
+        self.databus_files.append(dbfile)
+
     def get_target_uri(self):
 
         return f"https://databus.dbpedia.org/{self.account_name}/{self.group}/{self.artifact}/{self.version}"
 
     def __distinct_cvs(self) -> dict:
 
-        distinct_cv_definitions = {}
-        for dbfile in self.databus_files:
-            for key, value in dbfile.cvs.items():
-
-                if not key in distinct_cv_definitions:
-                    distinct_cv_definitions[key] = {
-                        "@type": "rdf:Property",
-                        "@id": f"dataid-cv:{key}",
-                        "rdfs:subPropertyOf": {"@id": "dataid:contentVariant"},
-                    }
-        return distinct_cv_definitions
+        return {
+            key: {
+                "@type": "rdf:Property",
+                "@id": f"dataid-cv:{key}",
+                "rdfs:subPropertyOf": {"@id": "dataid:contentVariant"},
+            }
+            for key in self.cv_index.keys
+        }
 
     def __dbfiles_to_dict(self):
 
@@ -158,24 +181,10 @@ class DataVersion:
 
 
 def deploy_to_databus(user: str, passwd: str, *databus_objects):
+    # the bearer token is cached and refreshed by the provider, so it is shared across calls and threads
+    token_provider = get_token_provider(TOKEN_URL, user, passwd)
     try:
-        # Request data for bearer token
-        data = {
-            "client_id": "upload-api",
-            "username": user,
-            "password": passwd,
-            "grant_type": "password",
-        }
-
-        # requesting the bearer token and saving it in a variable
-        print("Accessing new token...")
-        token_response = requests.post(
-            "https://databus.dbpedia.org/auth/realms/databus/protocol/openid-connect/token",
-            data=data,
-        )
-        print(f"Response: Status {token_response.status_code}")
-
-        token = token_response.json()["access_token"]
+        token_provider.get_token()
 
     except Exception as e:
         print(f"Error requesting token: {str(e)}")
@@ -186,10 +195,10 @@ def deploy_to_databus(user: str, passwd: str, *databus_objects):
         # The Authorisation header must be set with "Bearer $TOKEN"
         # https://databus.dbpedia.org/account/group for group metadata
         # https://databus.dbpedia.org/account/group/artifact/version for Databus version
-        headers = {"Authorization": "Bearer " + token}
+        headers = {"Authorization": "Bearer " + token_provider.get_token()}
 
         print(f"Deploying {dbobj.get_target_uri()}")
-        response = requests.put(
+        response = get_session().put(
             dbobj.get_target_uri(), headers=headers, data=dbobj.to_jsonld()
         )
         print(f"Response: Status {response.status_code}; Text: {response.text}")
@@ -2,10 +2,74 @@ import requests
 import json
 import hashlib
 import sys
+import threading
+import time
 from datetime import datetime
 from dataclasses import dataclass, field
 from typing import List
 
+# size of the chunks in which files are read while hashing
+CHUNK_SIZE = 1024 * 1024
+# (connect, read) timeout in seconds of all requests
+TIMEOUT = (10, 300)
+
+# keep-alive session shared by all requests of this script
+session = requests.Session()
+
+# tokens are refreshed this many seconds before they expire
+REFRESH_MARGIN = 30
+
+TOKEN_URL = "https://databus.dbpedia.org/auth/realms/databus/protocol/openid-connect/token"
+
+# bearer token of the upload API, its refresh_token and when they expire (time.monotonic), reused by all deploys
+# of the process. Same logic as databus_auth.TokenProvider, which this standalone script cannot import
+_token = {"user": None, "access_token": None, "expires_at": 0.0, "refresh_token": None, "refresh_expires_at": 0.0}
+_token_lock = threading.Lock()
+
+
+class TokenError(Exception):
+    """Raised if no bearer token could be obtained"""
+
+
+def _request_token(grant: dict):
+    print("Accessing new token...")
+    requested_at = time.monotonic()
+    token_response = session.post(TOKEN_URL, data={"client_id": "upload-api", **grant}, timeout=TIMEOUT)
+    print(f"Response: Status {token_response.status_code}")
+    if token_response.status_code != 200:
+        raise TokenError(f"Token request failed: {token_response.status_code} {token_response.text}")
+
+    token_data = token_response.json()
+    _token["access_token"] = token_data["access_token"]
+    _token["expires_at"] = requested_at + token_data.get("expires_in", 0)
+    _token["refresh_token"] = token_data.get("refresh_token")
+    _token["refresh_expires_at"] = requested_at + token_data.get("refresh_expires_in", 0)
+
+
+def get_token(user: str, passwd: str) -> str:
+    """Returns a bearer token that is valid for at least REFRESH_MARGIN seconds. Shortly before it expires it is
+    refreshed with the refresh_token, the password grant is only used for the first token or if refreshing fails.
+    Can be called from several threads."""
+    with _token_lock:
+        now = time.monotonic()
+        if _token["user"] == user:
+            if _token["access_token"] is not None and now < _token["expires_at"] - REFRESH_MARGIN:
+                return _token["access_token"]
+
+            if _token["refresh_token"] is not None and now < _token["refresh_expires_at"] - REFRESH_MARGIN:
+                try:
+                    _request_token({"grant_type": "refresh_token", "refresh_token": _token["refresh_token"]})
+                    return _token["access_token"]
+                except TokenError as e:
+                    print(f"Refreshing token failed, requesting a new one: {e}")
+
+        _request_token({"grant_type": "password", "username": user, "password": passwd})
+        _token["user"] = user
+        return _token["access_token"]
+
+class DuplicateDistributionError(Exception):
+    """Raised if two distributions of a version have the same content variants"""
+
 
 @dataclass
 class DataGroup:
@@ -45,16 +109,24 @@ class DataGroup:
 
 
 class DatabusFile:
-    def __init__(self, uri: str, cvs: dict, file_ext: str, **kwargs):
+    def __init__(self, uri: str, cvs: dict, file_ext: str, chunk_size: int = CHUNK_SIZE, **kwargs):
         """Fetches the necessary information of a file URI for the deploy to the databus."""
         self.uri = uri
         self.cvs = cvs
-        resp = requests.get(uri, **kwargs)
-        if resp.status_code > 400:
-            print(f"ERROR for {uri} -> Status {str(resp.status_code)}")
-
-        self.sha256sum = hashlib.sha256(bytes(resp.content)).hexdigest()
-        self.content_length = str(len(resp.content))
+        # stream the file through the hasher so memory usage does not depend on the file size
+        sha256 = hashlib.sha256()
+        content_length = 0
+        kwargs.setdefault("timeout", TIMEOUT)
+        with session.get(uri, stream=True, **kwargs) as resp:
+            if resp.status_code > 400:
+                print(f"ERROR for {uri} -> Status {str(resp.status_code)}")
+
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                sha256.update(chunk)
+                content_length += len(chunk)
+
+        self.sha256sum = sha256.hexdigest()
+        self.content_length = str(content_length)
         self.file_ext = file_ext
         self.id_string = "_".join([f"{k}={v}" for k, v in cvs.items()]) + "." + file_ext
 
@@ -76,23 +148,44 @@ class DataVersion:
     issued: datetime = field(default_factory=datetime.now)
     context: str = "https://raw.githubusercontent.com/dbpedia/databus-git-mockup/main/dev/context.jsonld"
 
+    def __post_init__(self):
+        # same index as cv_index.CVIndex, which this standalone script cannot import: the distinct content variant
+        # keys in order of first appearance and the position of each id_string, kept up to date by add_file.
+        # Raises DuplicateDistributionError right away instead of a rejected deploy
+        self._cv_keys = {}
+        self._positions_by_id_string = {}
+        for position, dbfile in enumerate(self.databus_files):
+            self.__index_file(position, dbfile)
+
+    def __index_file(self, position: int, dbfile: DatabusFile):
+        other = self._positions_by_id_string.get(dbfile.id_string)
+        if other is not None:
+            raise DuplicateDistributionError(
+                f"Distributions {other} and {position} have the same content variants: '{dbfile.id_string}'"
+            )
+        self._positions_by_id_string[dbfile.id_string] = position
+        for key in dbfile.cvs:
+            self._cv_keys.setdefault(key, None)
+
+    def add_file(self, dbfile: DatabusFile):
+        """Adds a distribution, raises DuplicateDistributionError if its content variants are already taken"""
+        self.__index_file(len(self.databus_files), dbfile)
+        self.databus_files.append(dbfile)
+
     def get_target_uri(self):
 
         return f"https://databus.dbpedia.org/{self.account_name}/{self.group}/{self.artifact}/{self.version}"
 
     def __distinct_cvs(self) -> dict:
 
-        distinct_cv_definitions = {}
-        for dbfile in self.databus_files:
-            for key, value in dbfile.cvs.items():
-
-                if key not in distinct_cv_definitions:
-                    distinct_cv_definitions[key] = {
-                        "@type": "rdf:Property",
-                        "@id": f"dataid-cv:{key}",
-                        "rdfs:subPropertyOf": {"@id": "dataid:contentVariant"},
-                    }
-        return distinct_cv_definitions
+        return {
+            key: {
+                "@type": "rdf:Property",
+                "@id": f"dataid-cv:{key}",
+                "rdfs:subPropertyOf": {"@id": "dataid:contentVariant"},
+            }
+            for key in self._cv_keys
+        }
 
     def __dbfiles_to_dict(self):
 
@@ -159,21 +252,7 @@ class DataVersion:
 
 def deploy_to_databus(user: str, passwd: str, *databus_objects):
     try:
-        data = {
-            "client_id": "upload-api",
-            "username": "lod-geoss",
-            "password": "beispielpasswort",
-            "grant_type": "password",
-        }
-
-        print("Accessing new token...")
-        token_response = requests.post(
-            "https://databus.dbpedia.org/auth/realms/databus/protocol/openid-connect/token",
-            data=data,
-        )
-        print(f"Response: Status {token_response.status_code}; Text: {token_response.text}")
-
-        token = token_response.json()["access_token"]
+        get_token("lod-geoss", "beispielpasswort")
 
     except Exception as e:
         print(f"ERROR: {str(e)}")
@@ -181,11 +260,11 @@ def deploy_to_databus(user: str, passwd: str, *databus_objects):
 
     for dbobj in databus_objects:
 
-        headers = {"Authorization": "Bearer " + token}
+        headers = {"Authorization": "Bearer " + get_token("lod-geoss", "beispielpasswort")}
 
         print(f"Deploying {dbobj.get_target_uri()}")
-        response = requests.put(
-            dbobj.get_target_uri(), headers=headers, data=dbobj.to_jsonld()
+        response = session.put(
+            dbobj.get_target_uri(), headers=headers, data=dbobj.to_jsonld(), timeout=TIMEOUT
         )
         print(f"Response: Status {response.status_code}; Text: {response.text}")
 
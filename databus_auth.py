@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Optional
+
+from http_session import get_session
+
+
+# tokens are refreshed this many seconds before they expire
+REFRESH_MARGIN = 30
+
+
+class TokenError(Exception):
+    """Raised if no bearer token could be obtained"""
+
+
+class TokenProvider:
+    def __init__(self, token_url: str, username: str, password: str, client_id: str = "upload-api"):
+        """Caches the OIDC bearer token of the legacy Databus upload API and refreshes it with the refresh_token
+        shortly before it expires. The password grant is only used for the first token or if refreshing fails.
+        The provider can be shared between threads."""
+        self.token_url = token_url
+        self.username = username
+        self.password = password
+        self.client_id = client_id
+        self._access_token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_token: Optional[str] = None
+        self._refresh_expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_token(self) -> str:
+        """Returns a bearer token that is valid for at least REFRESH_MARGIN seconds"""
+        with self._lock:
+            now = time.monotonic()
+            if self._access_token is not None and now < self._expires_at - REFRESH_MARGIN:
+                return self._access_token
+
+            if self._refresh_token is not None and now < self._refresh_expires_at - REFRESH_MARGIN:
+                try:
+                    self._request_token(
+                        {"grant_type": "refresh_token", "refresh_token": self._refresh_token}
+                    )
+                    return self._access_token
+                except TokenError as e:
+                    print(f"Refreshing token failed, requesting a new one: {e}")
+
+            self._request_token(
+                {"grant_type": "password", "username": self.username, "password": self.password}
+            )
+            return self._access_token
+
+    def _request_token(self, grant: dict):
+        print("Accessing new token...")
+        requested_at = time.monotonic()
+        resp = get_session().post(self.token_url, data={"client_id": self.client_id, **grant})
+        print(f"Response: Status {resp.status_code}")
+        if resp.status_code != 200:
+            raise TokenError(f"Token request to '{self.token_url}' failed: {resp.status_code} {resp.text}")
+
+        token_data = resp.json()
+        self._access_token = token_data["access_token"]
+        self._expires_at = requested_at + token_data.get("expires_in", 0)
+        self._refresh_token = token_data.get("refresh_token")
+        self._refresh_expires_at = requested_at + token_data.get("refresh_expires_in", 0)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(token_url: str, username: str, password: str) -> TokenProvider:
+    """Returns the TokenProvider for this token endpoint and user, shared by all deploy calls of the process"""
+    with _providers_lock:
+        provider = _providers.get((token_url, username))
+        if provider is None or provider.password != password:
+            provider = _providers[(token_url, username)] = TokenProvider(token_url, username, password)
+        return provider
@@ -1,15 +1,31 @@
 from databusclient import deploy, createDataset
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
 import os
+import pathlib
+import requests
 import yaml
 import json
 
+from cache_store import DEFAULT_CACHE_DIR
+from checksum_cache import CachedChecksum, ChecksumCache
+from distribution_templates import expand_template
+from http_session import PooledSession, get_session
+
 API_KEY = os.environ["DATABUS_API_KEY"]
 
 ACCOUNT_NAME = os.environ["DATABUS_ACCOUNT_NAME"]
 
 DATABUS_URI_BASE = "https://energy.databus.dbpedia.org"
 
+# libyaml based loader if pyyaml was built with it, the pure python one otherwise
+YAML_LOADER = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+MANIFEST_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "manifests")
+# threads revalidating the distributions of cached manifests
+REVALIDATE_WORKERS = 8
+
 # this will be in the next version from the databusclient package
 def create_distribution(url: str, cvs: Dict[str, str], file_format: str=None, compression: str=None) -> str:
     """Creates the the identifier-string for a distribution used as downloadURLs in the createDataset function.
@@ -32,10 +48,24 @@ def create_distribution(url: str, cvs: Dict[str, str], file_format: str=None, co
     return f"{url}|{meta_string}"
 
 
-def create_dataset_from_yaml(yaml_path: str):
+def expand_distributions(distribution_entries: List[dict]) -> Iterator[str]:
+    """Lazily yields the distribution strings of the manifest entries. An entry either has an url or an url_template,
+    which is expanded for every combination of its content_variants values (lists or ranges, see distribution_templates):
+        url_template: https://example.org/{year}/{region}.csv
+        content_variants:
+            year: {start: 2000, stop: 2020}
+            region: [north, south]
+    """
+    for dmap in distribution_entries:
+        if "url_template" in dmap:
+            for url, cvs in expand_template(dmap["url_template"], dmap["content_variants"]):
+                yield create_distribution(url=url, cvs=cvs, file_format=dmap.get("format", None), compression=dmap.get("compression", None))
+        else:
+            yield create_distribution(url=dmap["url"], cvs=dmap["content_variants"], file_format=dmap.get("format", None), compression=dmap.get("compression", None))
 
-    with open(yaml_path) as yamlfile:
-        data = yaml.load(yamlfile, Loader=yaml.FullLoader)
+
+def create_dataset_from_manifest(data: dict):
+    """Creates the dataset for one parsed manifest (see example/new_dataset.yml)"""
 
     groupid = data["group"]["id"]
     artifactid = data["dataset"]["artifact"]
@@ -43,7 +73,7 @@ def create_dataset_from_yaml(yaml_path: str):
 
     version_id = f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{groupid}/{artifactid}/{version}"
 
-    distribs = [create_distribution(url=dmap["url"], cvs=dmap["content_variants"], file_format=dmap.get("format", None), compression=dmap.get("compression", None)) for dmap in data["dataset"]["distributions"]]
+    distribs = expand_distributions(data["dataset"]["distributions"])
 
     dataset = createDataset(versionId=version_id, 
         title=data["dataset"]["title"], 
@@ -58,6 +88,139 @@ def create_dataset_from_yaml(yaml_path: str):
     return dataset
 
 
+def create_dataset_from_yaml(yaml_path: str):
+
+    with open(yaml_path) as yamlfile:
+        data = yaml.load(yamlfile, Loader=YAML_LOADER)
+
+    return create_dataset_from_manifest(data)
+
+
+def _iter_distributions(dataset: dict) -> Iterator[dict]:
+    """The distribution nodes (downloadURL, sha256sum, byteSize, ...) of a dataset created by createDataset"""
+    for node in dataset.get("@graph", []):
+        yield from node.get("distribution", [])
+
+
+def _fetch_validators(urls: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """ETag and Last-Modified of the urls, urls without an answer are left out"""
+    validators = {}
+    # a fresh session, the shared one of the parent process must not be used after the fork
+    with PooledSession() as session:
+        for url in urls:
+            try:
+                resp = session.head(url, allow_redirects=True)
+            except requests.RequestException:
+                continue
+            if resp.ok:
+                validators[url] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+    return validators
+
+
+def _compile_manifest(content: bytes) -> Tuple[List[dict], Dict[str, Tuple[Optional[str], Optional[str]]]]:
+    """Creates the datasets of all documents in the content of a manifest file. Also returns the validators
+    of the distribution files, taken before createDataset downloads them, so they never belong to newer content."""
+    documents = [data for data in yaml.load_all(content, Loader=YAML_LOADER) if data]
+    urls = [
+        distribution.split("|")[0]
+        for data in documents
+        for distribution in expand_distributions(data["dataset"]["distributions"])
+    ]
+    validators = _fetch_validators(urls)
+    return [create_dataset_from_manifest(data) for data in documents], validators
+
+
+def _record_checksums(datasets: List[dict], validators: dict, checksums: ChecksumCache):
+    for dataset in datasets:
+        for distribution in _iter_distributions(dataset):
+            url = distribution.get("downloadURL")
+            if url not in validators or "sha256sum" not in distribution:
+                continue
+            etag, last_modified = validators[url]
+            sha256sum, byte_size = distribution["sha256sum"], int(distribution["byteSize"])
+            # keep further digests the dev script computed for the same content
+            known = checksums.get(url)
+            digests = known.digests if known is not None and known.sha256sum == sha256sum else {}
+            checksums.put(url, CachedChecksum(etag, last_modified, sha256sum, byte_size, digests))
+
+
+def _is_unchanged(distribution: dict, checksums: ChecksumCache) -> bool:
+    """True if the file of the distribution still has the sha256sum and byteSize of the distribution,
+    checked with a conditional HEAD against the validators in the checksum cache"""
+    url = distribution.get("downloadURL")
+    entry = checksums.get(url) if url is not None else None
+    if (
+        entry is None
+        or entry.sha256sum != distribution.get("sha256sum")
+        or entry.byte_size != int(distribution.get("byteSize", -1))
+    ):
+        return False
+    try:
+        resp = get_session().head(url, headers=entry.conditional_headers(), allow_redirects=True)
+    except requests.RequestException:
+        return False
+    if resp.status_code == 304:
+        return True
+    if not resp.ok:
+        return False
+    if entry.etag is not None:
+        return resp.headers.get("ETag") == entry.etag
+    return resp.headers.get("Last-Modified") == entry.last_modified
+
+
+def _is_current(datasets: List[dict], checksums: ChecksumCache) -> bool:
+    """True if the checksums embedded in the cached datasets still match the distribution files"""
+    return all(_is_unchanged(distribution, checksums) for dataset in datasets for distribution in _iter_distributions(dataset))
+
+
+def compile_manifests(manifest_dir: str, cache_dir: str = MANIFEST_CACHE_DIR, max_workers: int = None) -> Dict[str, List[dict]]:
+    """Creates the datasets of all (multi-document) manifests *.yml/*.yaml in manifest_dir and its subfolders.
+    Compiled datasets are cached on disk by the hash of the manifest content. A cached manifest is only reused if the
+    files of all its distributions are unchanged (revalidated against the checksum cache), so new or changed
+    manifests and manifests with changed files are compiled again; these are compiled in a process pool with
+    max_workers processes. The checksum cache lives in the parent folder of cache_dir, so by default it is the one
+    shared with dev_databus_api_example. Returns manifest path -> list of datasets, in sorted path order."""
+
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = sorted(str(p) for pattern in ("*.yml", "*.yaml") for p in pathlib.Path(manifest_dir).rglob(pattern))
+
+    checksums = ChecksumCache(os.path.dirname(os.path.abspath(cache_dir)))
+    try:
+        compiled = {}
+        pending = {}
+        for path in paths:
+            with open(path, "rb") as manifest_file:
+                content = manifest_file.read()
+            # the datasets also depend on the target account
+            key = hashlib.sha256(f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}\n".encode("utf-8") + content).hexdigest()
+            cache_path = os.path.join(cache_dir, f"{key}.json")
+            if os.path.exists(cache_path):
+                with open(cache_path) as cache_file:
+                    compiled[path] = json.load(cache_file)
+            pending[path] = (content, cache_path)
+
+        # the checksums of the files behind the distributions are part of the datasets, so they are revalidated
+        cached = [path for path in paths if path in compiled]
+        with ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS) as executor:
+            for path, current in zip(cached, executor.map(lambda p: _is_current(compiled[p], checksums), cached)):
+                if current:
+                    del pending[path]
+
+        if pending:
+            print(f"Compiling {len(pending)} of {len(paths)} manifests")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(_compile_manifest, [content for content, _ in pending.values()])
+                for (path, (_, cache_path)), (datasets, validators) in zip(pending.items(), results):
+                    with open(cache_path, "w") as cache_file:
+                        json.dump(datasets, cache_file)
+                    _record_checksums(datasets, validators, checksums)
+                    compiled[path] = datasets
+    finally:
+        checksums.close()
+
+    return {path: compiled[path] for path in paths}
+
+
 if __name__ == "__main__":
     dataset = create_dataset_from_yaml("./example/new_dataset.yml")
     deploy(dataset, API_KEY)
\ No newline at end of file
@@ -0,0 +1,147 @@
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+from jsonld_contexts import CompiledContext, ContextError, ContextRegistry
+
+
+DEFAULT_DATABUS_URI_BASE = "https://energy.databus.dbpedia.org"
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+BYTE_SIZE_PATTERN = re.compile(r"^[0-9]+$")
+
+GROUP_REQUIRED = ("@id", "@type", "title", "abstract", "description")
+DATASET_REQUIRED = ("@id", "@type", "hasVersion", "title", "abstract", "description", "license", "distribution")
+DISTRIBUTION_REQUIRED = (
+    "@id",
+    "@type",
+    "file",
+    "formatExtension",
+    "compression",
+    "downloadURL",
+    "byteSize",
+    "sha256sum",
+)
+# content variant properties of the current (dcv:) and the legacy (dataid-cv:) dataid format
+CV_PREFIXES = ("dcv:", "dataid-cv:")
+
+
+class DataidValidator:
+    def __init__(self, databus_uri_base: str = DEFAULT_DATABUS_URI_BASE, contexts: Dict[str, CompiledContext] = None):
+        """Local checks of group and version documents before they are deployed: required fields, URIs under
+        databus_uri_base, sha256sum and byteSize format and content variants. If compiled contexts are given,
+        the properties of documents using one of these contexts must be defined in it.
+        All patterns are compiled once, so a validator can check large batches (and be sent to worker processes)."""
+        self.databus_uri_base = databus_uri_base.rstrip("/")
+        base = re.escape(self.databus_uri_base)
+        self._group_uri = re.compile(rf"^{base}/[^/#]+/[^/#]+$")
+        self._version_uri = re.compile(rf"^{base}/[^/#]+/[^/#]+/[^/#]+/[^/#]+$")
+        self.contexts = contexts or {}
+
+    @classmethod
+    def with_registry(cls, registry: ContextRegistry, context_urls: Iterable[str], **kwargs) -> "DataidValidator":
+        """Validator checking properties against the given contexts, contexts that cannot be loaded are skipped"""
+        contexts = {}
+        for url in context_urls:
+            try:
+                contexts[url] = registry.get_compiled(url)
+            except ContextError as e:
+                print(f"Not checking properties against '{url}': {e}")
+        return cls(contexts=contexts, **kwargs)
+
+    def validate_jsonld(self, jsonld: str) -> List[str]:
+        try:
+            document = json.loads(jsonld)
+        except ValueError as e:
+            return [f"Invalid JSON: {e}"]
+        return self.validate(document)
+
+    def validate(self, document: dict) -> List[str]:
+        """Returns the problems found in a group or version document, an empty list if it is valid"""
+        graph = document.get("@graph")
+        if not isinstance(graph, list) or not graph:
+            return ["Document has no @graph"]
+
+        issues = []
+        context = self.contexts.get(document.get("@context"))
+        declared_cvs = set()
+        datasets = []
+        for node in graph:
+            node_type = node.get("@type", "")
+            if context is not None:
+                issues.extend(self._check_properties(node, context))
+            if node_type in ("Group", "dataid:Group"):
+                issues.extend(self._check_group(node))
+            elif node_type in ("Dataset", "dataid:Dataset"):
+                datasets.append(node)
+            elif node_type == "rdf:Property":
+                declared_cvs.add(node.get("@id"))
+
+        for dataset in datasets:
+            issues.extend(self._check_dataset(dataset, declared_cvs))
+        return issues
+
+    def _check_properties(self, node: dict, context: CompiledContext) -> List[str]:
+        return [
+            f"{node.get('@id')}: property '{key}' is not defined in the context"
+            for key in node
+            if not context.is_defined(key)
+        ]
+
+    def _check_group(self, node: dict) -> List[str]:
+        issues = [f"Group: missing '{key}'" for key in GROUP_REQUIRED if not node.get(key)]
+        group_uri = node.get("@id", "")
+        if group_uri and not self._group_uri.match(group_uri):
+            issues.append(f"Group: '{group_uri}' is no group URI under {self.databus_uri_base}")
+        return issues
+
+    def _check_dataset(self, node: dict, declared_cvs: set) -> List[str]:
+        issues = [f"Dataset: missing '{key}'" for key in DATASET_REQUIRED if not node.get(key)]
+        dataset_uri = node.get("@id", "")
+        version_uri, _, fragment = dataset_uri.partition("#")
+        if dataset_uri and (not self._version_uri.match(version_uri) or fragment != "Dataset"):
+            issues.append(f"Dataset: '{dataset_uri}' is no <version URI>#Dataset under {self.databus_uri_base}")
+
+        distributions = node.get("distribution") or []
+        seen_ids = set()
+        seen_cvs = {}
+        for dst in distributions:
+            dst_id = dst.get("@id", "")
+            issues.extend(f"{dst_id or 'Distribution'}: missing '{key}'" for key in DISTRIBUTION_REQUIRED if key not in dst)
+            if dst_id in seen_ids:
+                issues.append(f"{dst_id}: duplicate distribution id")
+            seen_ids.add(dst_id)
+            if version_uri and not dst_id.startswith(version_uri + "#"):
+                issues.append(f"{dst_id}: distribution id is not in version {version_uri}")
+            if version_uri and not str(dst.get("file", "")).startswith(version_uri + "/"):
+                issues.append(f"{dst_id}: file '{dst.get('file')}' is not in version {version_uri}")
+            if "sha256sum" in dst and not SHA256_PATTERN.match(str(dst["sha256sum"])):
+                issues.append(f"{dst_id}: invalid sha256sum '{dst['sha256sum']}'")
+            if "byteSize" in dst and not BYTE_SIZE_PATTERN.match(str(dst["byteSize"])):
+                issues.append(f"{dst_id}: invalid byteSize '{dst['byteSize']}'")
+
+            cvs = tuple(sorted((k, str(v)) for k, v in dst.items() if k.startswith(CV_PREFIXES)))
+            for key, _ in cvs:
+                if key.startswith("dataid-cv:") and key not in declared_cvs:
+                    issues.append(f"{dst_id}: content variant '{key}' is not declared as rdf:Property")
+            if cvs in seen_cvs:
+                issues.append(f"{dst_id}: same content variants as {seen_cvs[cvs]}")
+            seen_cvs.setdefault(cvs, dst_id)
+        return issues
+
+
+def validate_batch(
+    databus_objects: Iterable[Union[str, object]],
+    validator: Optional[DataidValidator] = None,
+    max_workers: Optional[int] = None,
+) -> List[List[str]]:
+    """Validates groups/versions (or their JSON-LD strings) in one pass, in worker processes if max_workers is set.
+    Returns the problems of each object in the order of databus_objects."""
+    validator = validator or DataidValidator()
+    documents = [obj if isinstance(obj, str) else obj.to_jsonld() for obj in databus_objects]
+    if not max_workers or max_workers <= 1 or len(documents) <= 1:
+        return [validator.validate_jsonld(document) for document in documents]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunksize = max(1, len(documents) // (max_workers * 4))
+        return list(executor.map(validator.validate_jsonld, documents, chunksize=chunksize))
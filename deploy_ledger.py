@@ -0,0 +1,52 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+
+from cache_store import DEFAULT_CACHE_DIR, SqliteStore
+
+
+# fields that change on every serialization without changing the document
+VOLATILE_KEYS = frozenset(["issued", "modified"])
+
+
+def _strip_volatile(node):
+    if isinstance(node, dict):
+        return {k: _strip_volatile(v) for k, v in node.items() if k not in VOLATILE_KEYS}
+    if isinstance(node, list):
+        return [_strip_volatile(v) for v in node]
+    return node
+
+
+def canonical_digest(jsonld: str) -> str:
+    """sha256 of a JSON-LD document with sorted keys and without volatile fields"""
+    canonical = json.dumps(_strip_volatile(json.loads(jsonld)), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DeployLedger(SqliteStore):
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        """On-disk record of the canonical digest of the last document successfully deployed to each target URI.
+        The ledger can be shared between threads."""
+        super().__init__(
+            "deploy_ledger.sqlite",
+            "CREATE TABLE IF NOT EXISTS deploys ("
+            "target TEXT PRIMARY KEY, digest TEXT NOT NULL, deployed_at TEXT NOT NULL)",
+            cache_dir,
+        )
+
+    def last_digest(self, target: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM deploys WHERE target = ?", (target,)).fetchone()
+        return row[0] if row is not None else None
+
+    def is_unchanged(self, target: str, digest: str) -> bool:
+        """True if digest equals the digest of the last successful deploy to target"""
+        return self.last_digest(target) == digest
+
+    def record(self, target: str, digest: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO deploys VALUES (?, ?, ?)",
+                (target, digest, datetime.now().isoformat()),
+            )
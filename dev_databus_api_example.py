@@ -1,11 +1,44 @@
+import hashlib
 import os
 import requests
 import json
-import hashlib
+import threading
+import time
+import uuid
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from cache_store import DEFAULT_CACHE_DIR
+from checksum_cache import CachedChecksum, ChecksumCache
+from cv_index import CVIndex
+from dataid_validation import DataidValidator, validate_batch
+from deploy_ledger import DeployLedger, canonical_digest
+from distribution_table import DistributionTable
+from distribution_templates import iter_file_specs
+from file_digests import DEFAULT_MEASUREMENTS, DigestPipeline, Measurement
+from http_session import get_session
+from rate_limit import HostRateLimiter
+
+# size of the chunks in which files are read while hashing
+CHUNK_SIZE = 1024 * 1024
+# maximum number of files fetched and hashed at the same time
+MAX_FETCH_WORKERS = 8
+# how often an interrupted download is resumed before giving up
+MAX_RESUME_RETRIES = 5
+# suggested part_dir of DatabusFile: received bytes of unfinished downloads, so a later run can resume them
+DOWNLOAD_PART_DIR = os.path.join(DEFAULT_CACHE_DIR, "parts")
+# maximum number of concurrent PUTs of a bulk deploy
+MAX_DEPLOY_WORKERS = 4
+# sustained PUTs per second and burst size allowed per host during a bulk deploy
+DEPLOY_RATE_PER_HOST = 5.0
+DEPLOY_BURST = 5
+# stands in for the distributions while the rest of a version is serialized
+_DISTRIBUTION_PLACEHOLDER = f"distributions-{uuid.uuid4()}"
 
 DATABUS_URI_BASE = "https://energy.databus.dbpedia.org"
 DEFAULT_CONTEXT = "https://downloads.dbpedia.org/databus/context.jsonld"
@@ -63,20 +96,301 @@ class DataGroup:
         return json.dumps(group_data_dict)
 
 
+class _PartFile:
+    """The bytes received so far of a download, together with the ETag / Last-Modified of the response they belong to"""
+
+    def __init__(self, part_dir: str, uri: str):
+        key = hashlib.sha256(uri.encode("utf-8")).hexdigest()
+        self.part_dir = part_dir
+        self.uri = uri
+        self.path = os.path.join(part_dir, f"{key}.part")
+        self.meta_path = os.path.join(part_dir, f"{key}.json")
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self._file = None
+        if os.path.exists(self.path) and os.path.exists(self.meta_path):
+            with open(self.meta_path) as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("uri") == uri:
+                self.etag, self.last_modified = meta.get("etag"), meta.get("last_modified")
+
+    @property
+    def validator(self) -> Optional[str]:
+        return self.etag or self.last_modified
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if self.validator is not None else 0
+
+    def start(self, etag: Optional[str], last_modified: Optional[str]):
+        """Starts an empty part for a response with these validators"""
+        self.close()
+        os.makedirs(self.part_dir, exist_ok=True)
+        self.etag, self.last_modified = etag, last_modified
+        with open(self.meta_path, "w") as meta_file:
+            json.dump({"uri": self.uri, "etag": etag, "last_modified": last_modified}, meta_file)
+        self._file = open(self.path, "wb")
+
+    def resume(self):
+        self._file = open(self.path, "ab")
+
+    def write(self, chunk: bytes):
+        if self._file is not None:
+            self._file.write(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        self.etag = self.last_modified = None
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
 class DatabusFile:
-    def __init__(self, uri: str, cvs: dict, file_ext: str, **kwargs):
-        """Fetches the necessary information of a file URI for the deploy to the databus."""
+    def __init__(
+        self,
+        uri: str,
+        cvs: dict,
+        file_ext: str,
+        chunk_size: int = CHUNK_SIZE,
+        cache: Optional[ChecksumCache] = None,
+        lazy: bool = False,
+        measurements: Sequence[Callable[[], Measurement]] = DEFAULT_MEASUREMENTS,
+        max_retries: int = MAX_RESUME_RETRIES,
+        local_path: Optional[str] = None,
+        part_dir: Optional[str] = None,
+        **kwargs,
+    ):
+        """Fetches the necessary information of a file URI for the deploy to the databus.
+        All measurements (see file_digests) are computed in the same pass over the file.
+        Interrupted downloads are resumed with range requests up to max_retries times. With a part_dir
+        (e.g. DOWNLOAD_PART_DIR) the received bytes are also kept there, so a download that could not be finished
+        is resumed by the next run. This costs a full copy of every download on disk while it runs,
+        up to max_workers files at once with fetch_databus_files, so it is off by default.
+        Files given as file:// URI or plain path are read from disk. local_path can point to a
+        staged copy of a remote file, which is then hashed instead of downloading uri.
+        If a cache is passed, a known file is only downloaded again if it changed upstream.
+        If lazy is set, the file is only fetched on first access of its digests."""
         self.uri = uri
         self.cvs = cvs
-        print(f"Fetching data from '{uri}'")
-        resp = requests.get(uri, **kwargs)
-        if resp.status_code > 400:
-            print(f"ERROR for {uri} -> Status {str(resp.status_code)}")
-
-        self.sha256sum = hashlib.sha256(bytes(resp.content)).hexdigest()
-        self.content_length = str(len(resp.content))
         self.file_ext = file_ext
         self.id_string = "_".join([f"{k}={v}" for k, v in cvs.items()]) + "." + file_ext
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.measurements = measurements
+        self.max_retries = max_retries
+        self.part_dir = part_dir
+        self.local_path = local_path if local_path is not None else _local_path(uri)
+        self.request_kwargs = kwargs
+        self._digests = None
+        self._fetch_lock = threading.Lock()
+        if not lazy:
+            self.fetch()
+
+    @property
+    def digests(self) -> dict:
+        if self._digests is None:
+            self.fetch()
+        return self._digests
+
+    @property
+    def sha256sum(self) -> str:
+        return self.digests["sha256sum"]
+
+    @property
+    def content_length(self) -> str:
+        return str(self.digests["byteSize"])
+
+    @property
+    def compression(self) -> str:
+        return self.digests.get("compression", "none")
+
+    def fetch(self):
+        """Downloads and hashes the file, unless this already happened"""
+        with self._fetch_lock:
+            if self._digests is not None:
+                return
+            pipeline = DigestPipeline(self.measurements)
+            if self.local_path is not None:
+                print(f"Hashing local file '{self.local_path}'")
+                self._digests = self._read_digests(pipeline)
+                return
+
+            part = _PartFile(self.part_dir, self.uri) if self.part_dir is not None else None
+            if part is not None and part.validator is not None:
+                print(f"Resuming download of '{self.uri}' after {part.size} bytes")
+                self._read_into(part.path, pipeline)
+                digests = self._stream_digests(None, pipeline, part=part, offset=part.size)
+                self._cache_digests(part.etag, part.last_modified, digests)
+                part.remove()
+                self._digests = digests
+                return
+
+            print(f"Fetching data from '{self.uri}'")
+            kwargs = dict(self.request_kwargs)
+            cached = self.cache.get(self.uri) if self.cache is not None else None
+            # a cached entry can only be reused if it holds every digest of the pipeline
+            if cached is not None and pipeline.provides <= {"sha256sum", "byteSize", *cached.digests}:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), **cached.conditional_headers()}
+            else:
+                cached = None
+
+            with get_session().get(self.uri, stream=True, **kwargs) as resp:
+                if resp.status_code > 400:
+                    print(f"ERROR for {self.uri} -> Status {str(resp.status_code)}")
+
+                if cached is not None and resp.status_code == 304:
+                    known = {**cached.digests, "sha256sum": cached.sha256sum, "byteSize": cached.byte_size}
+                    digests = {k: v for k, v in known.items() if k in pipeline.provides}
+                else:
+                    digests = self._stream_digests(resp, pipeline, part=part if resp.ok else None)
+                    if resp.ok:
+                        self._cache_digests(resp.headers.get("ETag"), resp.headers.get("Last-Modified"), digests)
+                    if part is not None:
+                        part.remove()
+
+            self._digests = digests
+
+    def _cache_digests(self, etag: Optional[str], last_modified: Optional[str], digests: dict):
+        if self.cache is not None:
+            self.cache.put(
+                self.uri,
+                CachedChecksum(
+                    etag=etag,
+                    last_modified=last_modified,
+                    sha256sum=digests["sha256sum"],
+                    byte_size=digests["byteSize"],
+                    digests={k: v for k, v in digests.items() if k not in ("sha256sum", "byteSize")},
+                ),
+            )
+
+    def _read_into(self, path: str, pipeline: DigestPipeline):
+        """Reads the file at path into a reused buffer and passes views of it to the pipeline,
+        so no copies are made on the python level. hashlib releases the GIL for large updates,
+        so local files can be hashed in parallel with prefetch_databus_files."""
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as local_file:
+            while True:
+                n = local_file.readinto(buffer)
+                if not n:
+                    break
+                pipeline.update(view[:n])
+
+    def _read_digests(self, pipeline: DigestPipeline) -> dict:
+        self._read_into(self.local_path, pipeline)
+        return pipeline.result()
+
+    def _stream_digests(
+        self, resp: Optional[requests.Response], pipeline: DigestPipeline, part: Optional[_PartFile] = None, offset: int = 0
+    ) -> dict:
+        """Streams the file through the pipeline, so memory usage does not depend on the file size.
+        If the connection breaks, the download continues with a range request from the last received byte
+        and keeps feeding the same pipeline, so the digests are the same as for an uninterrupted download.
+        This needs an ETag or Last-Modified of the file, without one the download starts over.
+        With a part file, the received bytes are also written to disk. resp is None when continuing the part
+        of an earlier run, whose offset bytes have already been fed to the pipeline."""
+        retries = 0
+        if resp is not None:
+            etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+            # offsets refer to the decoded content, so ranges of content-encoded responses cannot be resumed
+            resumable = resp.headers.get("Content-Encoding") in (None, "identity")
+            if part is not None and resumable and (etag or last_modified):
+                part.start(etag, last_modified)
+            else:
+                part = None
+        else:
+            etag, last_modified, resumable = part.etag, part.last_modified, True
+            part.resume()
+
+        try:
+            while True:
+                try:
+                    if resp is None:
+                        # without a validator a changed file cannot be detected, so it is downloaded again from the start
+                        validator = etag or last_modified
+                        resp = self._request_rest(offset if resumable and validator else 0, validator)
+                        if resp.status_code == 416:
+                            # the part already holds the whole file, it cannot be told apart from a changed one
+                            resp.close()
+                            resp = self._request_rest(0, None)
+                        if resp.status_code != 206:
+                            # range not supported or the file changed in between: start over
+                            resp.raise_for_status()
+                            pipeline = DigestPipeline(self.measurements)
+                            offset = 0
+                            etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                            resumable = resp.headers.get("Content-Encoding") in (None, "identity")
+                            if part is not None:
+                                part.start(etag, last_modified)
+                    for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                        pipeline.update(chunk)
+                        if part is not None:
+                            part.write(chunk)
+                        offset += len(chunk)
+                    return pipeline.result()
+                except (
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                ) as e:
+                    if resp is not None:
+                        resp.close()
+                        resp = None
+                    if retries >= self.max_retries:
+                        raise
+                    retries += 1
+                    print(f"Download of {self.uri} interrupted after {offset} bytes ({e}), retry {retries}")
+                    time.sleep(min(2 ** retries, 30))
+        finally:
+            if part is not None:
+                part.close()
+
+    def _request_rest(self, offset: int, validator: Optional[str]) -> requests.Response:
+        """Requests the file from byte offset on, if it still has the given ETag / Last-Modified"""
+        headers = dict(self.request_kwargs.get("headers") or {})
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+            # ranges count bytes of the unencoded file
+            headers["Accept-Encoding"] = "identity"
+            if validator is not None:
+                headers["If-Range"] = validator
+        return get_session().get(self.uri, stream=True, **{**self.request_kwargs, "headers": headers})
+
+
+def _local_path(uri: str) -> Optional[str]:
+    """Returns the path of a file:// URI or plain path, None for remote URIs"""
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        return url2pathname(parsed.path)
+    # a single letter scheme is a windows drive
+    if len(parsed.scheme) <= 1:
+        return uri
+    return None
+
+
+def prefetch_databus_files(databus_files: Iterable[DatabusFile], max_workers: int = MAX_FETCH_WORKERS):
+    """Fetches and hashes (lazy) DatabusFiles in parallel, with at most max_workers downloads or local files in flight."""
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(DatabusFile.fetch, databus_files):
+            pass
+
+
+def fetch_databus_files(
+    file_specs: Iterable[Tuple[str, dict, str]], max_workers: int = MAX_FETCH_WORKERS, **kwargs
+) -> List[DatabusFile]:
+    """Fetches and hashes the (uri, cvs, file_ext) specs in parallel, with at most max_workers downloads in flight.
+    The returned files keep the order of file_specs."""
+
+    databus_files = [DatabusFile(*spec, lazy=True, **kwargs) for spec in file_specs]
+    prefetch_databus_files(databus_files, max_workers=max_workers)
+    return databus_files
 
 
 @dataclass
@@ -89,7 +403,8 @@ class DataVersion:
     abstract: str
     description: str
     license: str
-    databus_files: List[DatabusFile]
+    # a DistributionTable keeps the memory footprint small for versions with very many distributions
+    databus_files: Union[List[DatabusFile], DistributionTable]
     issued: datetime = field(default_factory=datetime.now)
     context: str = DEFAULT_CONTEXT
 
@@ -101,26 +416,71 @@ class DataVersion:
         )
         self.group_uri = f"{DATABUS_URI_BASE}/{self.account_name}/{self.group}"
         self.timestamp = self.issued.strftime("%Y-%m-%dT%H:%M:%SZ")
+        # raises DuplicateDistributionError right away instead of a rejected deploy. The index holds every
+        # id_string, so for a DistributionTable it is only built once add_file or find_files need it
+        self.cv_index: Optional[CVIndex] = None
+        if not isinstance(self.databus_files, DistributionTable):
+            self.build_cv_index()
 
     @classmethod
-    def from_yaml(cls, yaml_path):
+    def from_yaml(
+        cls,
+        yaml_path,
+        max_workers: int = MAX_FETCH_WORKERS,
+        cache: Optional[ChecksumCache] = None,
+        lazy: bool = False,
+        measurements: Sequence[Callable[[], Measurement]] = DEFAULT_MEASUREMENTS,
+    ):
+        """Loads a version from yaml. Files are given as [uri, cvs, file_ext] or as url templates (see iter_file_specs).
+        With lazy set, the files are only fetched once they are serialized. measurements are computed for every
+        file, e.g. file_digests.LINE_COUNT_MEASUREMENTS to add the line count."""
         with open(yaml_path) as yaml_file:
             data = yaml.load(yaml_file, Loader=yaml.FullLoader)
-            return cls(
-                account_name=ACCOUNT_NAME,
-                group=data["group"],
-                artifact=data["artifact"],
-                version=data["version"],
-                title=data["title"],
-                abstract=data["abstract"],
-                description=data["description"],
-                license=data["license"],
-                databus_files=[DatabusFile(a, b, c) for a, b, c in data["files"]],
+
+        if lazy:
+            databus_files = [
+                DatabusFile(a, b, c, cache=cache, lazy=True, measurements=measurements)
+                for a, b, c in iter_file_specs(data["files"])
+            ]
+        else:
+            databus_files = fetch_databus_files(
+                iter_file_specs(data["files"]), max_workers=max_workers, cache=cache, measurements=measurements
             )
 
+        return cls(
+            account_name=ACCOUNT_NAME,
+            group=data["group"],
+            artifact=data["artifact"],
+            version=data["version"],
+            title=data["title"],
+            abstract=data["abstract"],
+            description=data["description"],
+            license=data["license"],
+            databus_files=databus_files,
+        )
+
     def get_target_uri(self):
         return f"{DATABUS_URI_BASE}/{self.account_name}/{self.group}/{self.artifact}/{self.version}"
 
+    def build_cv_index(self) -> CVIndex:
+        """Indexes the content variants of all distributions,
+        raises DuplicateDistributionError if two of them have the same ones"""
+        if self.cv_index is None:
+            cv_index = CVIndex()
+            for position, dbfile in enumerate(self.databus_files):
+                cv_index.add(position, dbfile.cvs, dbfile.id_string)
+            self.cv_index = cv_index
+        return self.cv_index
+
+    def add_file(self, dbfile: DatabusFile):
+        """Adds a distribution, raises DuplicateDistributionError if its content variants are already taken"""
+        self.build_cv_index().add(len(self.databus_files), dbfile.cvs, dbfile.id_string)
+        self.databus_files.append(dbfile)
+
+    def find_files(self, **cvs) -> list:
+        """All distributions with the given content variant values, e.g. find_files(type="turbineData")"""
+        return [self.databus_files[position] for position in self.build_cv_index().find(**cvs)]
+
     def __dbfiles_to_dict(self):
         for dbfile in self.databus_files:
             file_dst = {
@@ -128,18 +488,25 @@ class DataVersion:
                 "file": f"{self.version_uri}/{self.artifact}_{dbfile.id_string}",
                 "@type": "dataid:Part",
                 "formatExtension": dbfile.file_ext,
-                "compression": "none",
+                "compression": dbfile.compression,
                 "downloadURL": dbfile.uri,
                 "byteSize": dbfile.content_length,
                 "sha256sum": dbfile.sha256sum,
             }
 
+            # further measurements of the digest pipeline, e.g. uncompressedByteSize
+            for key, value in dbfile.digests.items():
+                if key not in ("sha256sum", "byteSize", "compression") and value is not None:
+                    file_dst[f"dataid:{key}"] = value
+
             for key, value in dbfile.cvs.items():
                 file_dst[f"dcv:{key}"] = value
 
             yield file_dst
 
-    def to_jsonld(self) -> str:
+    def iter_jsonld(self) -> Iterator[str]:
+        """Serializes the version piece by piece: the dataset node and then one distribution at a time,
+        so the complete document never has to be held in memory. The joined pieces equal to_jsonld()."""
         data_id_dict = {
             "@context": self.context,
             "@graph": [
@@ -152,29 +519,168 @@ class DataVersion:
                     "abstract": self.abstract,
                     "description": self.description,
                     "license": self.license,
-                    "distribution": list(self.__dbfiles_to_dict()),
+                    "distribution": _DISTRIBUTION_PLACEHOLDER,
                 }
             ],
         }
-        return json.dumps(data_id_dict)
+        head, tail = json.dumps(data_id_dict).split(json.dumps(_DISTRIBUTION_PLACEHOLDER))
 
+        yield head + "["
+        separator = ""
+        for file_dst in self.__dbfiles_to_dict():
+            yield separator + json.dumps(file_dst)
+            separator = ", "
+        yield "]" + tail
 
-def deploy_to_databus(api_key: str, databus_object):
-    target = databus_object.get_target_uri()
-    print(f"Deploying {target}")
-    submission_data = databus_object.to_jsonld()
+    def write_jsonld(self, fp: TextIO):
+        """Writes the JSON-LD of the version to a file-like object without building it in memory"""
+        for piece in self.iter_jsonld():
+            fp.write(piece)
 
-    resp = requests.put(
+    def jsonld_body(self, buffer_size: int = 64 * 1024) -> Iterator[bytes]:
+        """The JSON-LD as chunks of about buffer_size bytes, e.g. for a chunked request body (requests data=...)"""
+        buffer = []
+        buffered = 0
+        for piece in self.iter_jsonld():
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= buffer_size:
+                yield "".join(buffer).encode("utf-8")
+                buffer, buffered = [], 0
+        if buffer:
+            yield "".join(buffer).encode("utf-8")
+
+    def to_jsonld(self) -> str:
+        return "".join(self.iter_jsonld())
+
+
+def _put_to_databus(api_key: str, target: str, submission_data: str) -> requests.Response:
+    return get_session().put(
         target,
         headers={"X-API-Key": api_key, "Content-Type": "application/json"},
         data=submission_data,
     )
 
+
+def deploy_to_databus(
+    api_key: str,
+    databus_object,
+    ledger: Optional[DeployLedger] = None,
+    force: bool = False,
+    validator: Optional[DataidValidator] = None,
+) -> bool:
+    """Deploys a group or version. With a ledger, documents identical to the last successful deploy
+    to the same target (ignoring volatile fields like issued) are skipped unless force is set.
+    With a validator, invalid documents raise a DatabusError before anything is sent.
+    Returns whether the document was sent."""
+    target = databus_object.get_target_uri()
+    submission_data = databus_object.to_jsonld()
+    if validator is not None:
+        issues = validator.validate_jsonld(submission_data)
+        if issues:
+            raise DatabusError(f"Invalid document for '{target}':\n" + "\n".join(issues))
+    digest = canonical_digest(submission_data) if ledger is not None else None
+    if digest is not None and not force and ledger.is_unchanged(target, digest):
+        print(f"Skipping unchanged {target}")
+        return False
+
+    print(f"Deploying {target}")
+    resp = _put_to_databus(api_key, target, submission_data)
+
     if resp.status_code >= 400:
         print(f"Response: Status {resp.status_code}; Text: {resp.text}")
         print(f"Problematic file:\n {submission_data}")
         raise DatabusError(f"Could not deploy '{target}'")
 
+    if digest is not None:
+        ledger.record(target, digest)
+    return True
+
+
+@dataclass
+class DeployResult:
+    """Outcome of deploying a single DataGroup or DataVersion"""
+
+    target: str
+    ok: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+def bulk_deploy_to_databus(
+    api_key: str,
+    databus_objects: Iterable[Union[DataGroup, DataVersion]],
+    max_workers: int = MAX_DEPLOY_WORKERS,
+    rate_per_host: float = DEPLOY_RATE_PER_HOST,
+    burst: int = DEPLOY_BURST,
+    ledger: Optional[DeployLedger] = None,
+    force: bool = False,
+    validator: Optional[DataidValidator] = None,
+    validation_workers: Optional[int] = None,
+) -> List[DeployResult]:
+    """Deploys groups and versions concurrently with at most max_workers PUTs in flight and at most rate_per_host
+    PUTs per second to each host. All groups are deployed before the versions, versions of a group that failed are
+    not deployed. With a ledger, unchanged documents are skipped as in deploy_to_databus.
+    With a validator, the whole batch is validated (in validation_workers processes) before the first PUT
+    and invalid objects are not deployed.
+    Returns one DeployResult per object, in the order of databus_objects."""
+
+    databus_objects = list(databus_objects)
+    limiter = HostRateLimiter(rate_per_host, burst)
+    invalid = {}
+    documents = {}
+    if validator is not None:
+        serialized = [obj.to_jsonld() for obj in databus_objects]
+        batch_issues = validate_batch(serialized, validator, max_workers=validation_workers)
+        for obj, document, issues in zip(databus_objects, serialized, batch_issues):
+            if issues:
+                invalid[id(obj)] = DeployResult(obj.get_target_uri(), ok=False, error="\n".join(issues))
+            else:
+                documents[id(obj)] = document
+
+    def deploy(databus_object) -> DeployResult:
+        target = databus_object.get_target_uri()
+        if id(databus_object) in invalid:
+            return invalid[id(databus_object)]
+        try:
+            submission_data = documents.pop(id(databus_object), None) or databus_object.to_jsonld()
+            digest = canonical_digest(submission_data) if ledger is not None else None
+            if digest is not None and not force and ledger.is_unchanged(target, digest):
+                return DeployResult(target, ok=True, skipped=True)
+            limiter.acquire(target)
+            resp = _put_to_databus(api_key, target, submission_data)
+        except Exception as e:
+            return DeployResult(target, ok=False, error=f"{type(e).__name__}: {e}")
+        if resp.status_code >= 400:
+            return DeployResult(target, ok=False, status_code=resp.status_code, error=resp.text)
+        if digest is not None:
+            ledger.record(target, digest)
+        return DeployResult(target, ok=True, status_code=resp.status_code)
+
+    groups = [obj for obj in databus_objects if isinstance(obj, DataGroup)]
+    versions = [obj for obj in databus_objects if not isinstance(obj, DataGroup)]
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for group, result in zip(groups, executor.map(deploy, groups)):
+            results[id(group)] = result
+        failed_groups = {
+            (group.account_name, group.id) for group in groups if not results[id(group)].ok
+        }
+
+        def deploy_version(version) -> DeployResult:
+            if (version.account_name, version.group) in failed_groups:
+                return DeployResult(
+                    version.get_target_uri(), ok=False, error=f"Group '{version.group}' could not be deployed"
+                )
+            return deploy(version)
+
+        for version, result in zip(versions, executor.map(deploy_version, versions)):
+            results[id(version)] = result
+
+    return [results[id(obj)] for obj in databus_objects]
+
 
 if __name__ == "__main__":
     databus_group = DataGroup.from_yaml("example/group.yaml")
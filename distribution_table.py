@@ -0,0 +1,147 @@
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class _ValuePool:
+    """Stores every distinct value (mostly strings) once and refers to it by index"""
+
+    def __init__(self):
+        self.values: list = []
+        self._ids: dict = {}
+
+    def add(self, value) -> int:
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = self._ids[value] = len(self.values)
+            self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        return value_id
+
+
+class DistributionRow:
+    """Read-only view of one row of a DistributionTable with the attributes of a DatabusFile"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "DistributionTable", index: int):
+        self._table = table
+        self._index = index
+
+    @property
+    def uri(self) -> str:
+        return self._table.uris[self._index]
+
+    @property
+    def file_ext(self) -> str:
+        return self._table._values.values[self._table._file_exts[self._index]]
+
+    @property
+    def compression(self) -> str:
+        return self._table._values.values[self._table._compressions[self._index]]
+
+    @property
+    def sha256sum(self) -> str:
+        return self._table._sha256[self._index * 32 : (self._index + 1) * 32].hex()
+
+    @property
+    def content_length(self) -> str:
+        return str(self._table._byte_sizes[self._index])
+
+    @property
+    def cvs(self) -> dict:
+        table = self._table
+        keys = table._cv_patterns[table._cv_pattern_ids[self._index]]
+        start = table._cv_offsets[self._index]
+        values = table._cv_values[start : start + len(keys)]
+        return {key: table._values.values[value_id] for key, value_id in zip(keys, values)}
+
+    @property
+    def id_string(self) -> str:
+        return "_".join([f"{k}={v}" for k, v in self.cvs.items()]) + "." + self.file_ext
+
+    @property
+    def digests(self) -> dict:
+        digests = {
+            "sha256sum": self.sha256sum,
+            "byteSize": self._table._byte_sizes[self._index],
+            "compression": self.compression,
+        }
+        for key, column in self._table._extra_digests.items():
+            digests[key] = column[self._index]
+        return digests
+
+
+class DistributionTable:
+    def __init__(self, databus_files: Iterable = ()):
+        """Column-wise storage for the distributions of a (large) DataVersion.
+        Digests and sizes live in arrays, file extensions, compressions and content variant values are interned
+        and content variant keys are stored once per distinct key combination instead of once per file.
+        Any object with the attributes of a DatabusFile can be appended; it is not referenced afterwards,
+        so a generator of DatabusFiles can be consumed with constant overhead per file.
+        Iterating yields DistributionRow views, so the table can be passed to DataVersion as databus_files."""
+        self.uris: List[str] = []
+        self._values = _ValuePool()
+        self._file_exts = array("I")
+        self._compressions = array("I")
+        self._sha256 = bytearray()
+        self._byte_sizes = array("q")
+        self._cv_patterns: List[Tuple[str, ...]] = []
+        self._cv_pattern_ids_by_keys: Dict[Tuple[str, ...], int] = {}
+        self._cv_pattern_ids = array("I")
+        self._cv_offsets = array("Q")
+        self._cv_values = array("I")
+        # further digests of the pipeline (e.g. uncompressedByteSize), None where a file has no value
+        self._extra_digests: Dict[str, list] = {}
+        self.extend(databus_files)
+
+    @property
+    def cv_keys(self) -> List[str]:
+        """All distinct content variant keys, in order of first appearance"""
+        return list(dict.fromkeys(key for pattern in self._cv_patterns for key in pattern))
+
+    def append(self, databus_file):
+        index = len(self.uris)
+        digests = databus_file.digests
+        self.uris.append(databus_file.uri)
+        self._file_exts.append(self._values.add(databus_file.file_ext))
+        self._compressions.append(self._values.add(digests.get("compression", "none")))
+        self._sha256 += bytes.fromhex(digests["sha256sum"])
+        self._byte_sizes.append(digests["byteSize"])
+
+        keys = tuple(databus_file.cvs)
+        pattern_id = self._cv_pattern_ids_by_keys.get(keys)
+        if pattern_id is None:
+            pattern_id = self._cv_pattern_ids_by_keys[keys] = len(self._cv_patterns)
+            self._cv_patterns.append(keys)
+        self._cv_pattern_ids.append(pattern_id)
+        self._cv_offsets.append(len(self._cv_values))
+        self._cv_values.extend(self._values.add(value) for value in databus_file.cvs.values())
+
+        for key, value in digests.items():
+            if key in ("sha256sum", "byteSize", "compression"):
+                continue
+            column = self._extra_digests.get(key)
+            if column is None:
+                column = self._extra_digests[key] = [None] * index
+            column.append(value)
+        for column in self._extra_digests.values():
+            if len(column) == index:
+                column.append(None)
+
+    def extend(self, databus_files: Iterable):
+        for databus_file in databus_files:
+            self.append(databus_file)
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def __getitem__(self, index: int) -> DistributionRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("distribution index out of range")
+        return DistributionRow(self, index)
+
+    def __iter__(self) -> Iterator[DistributionRow]:
+        for index in range(len(self.uris)):
+            yield DistributionRow(self, index)
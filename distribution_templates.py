@@ -0,0 +1,39 @@
+import itertools
+from typing import Dict, Iterable, Iterator, Tuple
+
+
+def expand_cv_values(values) -> list:
+    """Values of one content variant: a list, a range {start: 2000, stop: 2020, step: 1} (stop inclusive)
+    or a single value"""
+    if isinstance(values, dict):
+        step = values.get("step", 1)
+        return list(range(values["start"], values["stop"] + (1 if step > 0 else -1), step))
+    if isinstance(values, (list, tuple)):
+        return list(values)
+    return [values]
+
+
+def expand_template(url_template: str, cv_values: Dict[str, object]) -> Iterator[Tuple[str, dict]]:
+    """Lazily yields (url, cvs) for every combination of content variant values, e.g.
+    expand_template("https://example.org/{year}/{region}.csv", {"year": {"start": 2020, "stop": 2021}, "region": ["north", "south"]})
+    The placeholders of the template are filled with the content variants of each combination."""
+    keys = list(cv_values)
+    for combination in itertools.product(*(expand_cv_values(cv_values[key]) for key in keys)):
+        cvs = dict(zip(keys, combination))
+        yield url_template.format(**cvs), cvs
+
+
+def iter_file_specs(file_entries: Iterable) -> Iterator[Tuple[str, dict, str]]:
+    """Lazily yields the (uri, cvs, file_ext) specs of the files list of a version yaml. Entries are either
+    [uri, cvs, file_ext] or templates expanded with expand_template:
+        - url_template: https://example.org/{year}/{region}.csv
+          content_variants: {year: {start: 2000, stop: 2020}, region: [north, south]}
+          file_ext: csv
+    """
+    for entry in file_entries:
+        if isinstance(entry, dict):
+            for uri, cvs in expand_template(entry["url_template"], entry["content_variants"]):
+                yield uri, cvs, entry["file_ext"]
+        else:
+            uri, cvs, file_ext = entry
+            yield uri, cvs, file_ext
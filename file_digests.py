@@ -0,0 +1,263 @@
+import bz2
+import hashlib
+import lzma
+import zlib
+from functools import partial
+from typing import Callable, Optional, Sequence
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+
+# upper bound for the output of a single decompression step, keeps memory constant for highly compressed data
+MAX_DECOMPRESSED_CHUNK = 1024 * 1024
+
+COMPRESSION_MAGIC_BYTES = {
+    b"\x1f\x8b": "gz",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zst",
+}
+MAGIC_BYTES_LENGTH = max(len(magic) for magic in COMPRESSION_MAGIC_BYTES)
+
+
+def detect_compression(head: bytes) -> str:
+    """Returns the compression identifier used by the databus (e.g. gz, bz2) for the first bytes of a file"""
+    for magic, compression in COMPRESSION_MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return "none"
+
+
+class Measurement:
+    """A single measurement over the content of a file, fed chunk by chunk while the file is streamed.
+    provides lists the keys of the dict returned by result."""
+
+    provides: Sequence[str] = ()
+
+    def update(self, chunk: bytes):
+        raise NotImplementedError
+
+    def result(self) -> dict:
+        raise NotImplementedError
+
+
+class Sha256Digest(Measurement):
+    provides = ("sha256sum",)
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes):
+        self._hash.update(chunk)
+
+    def result(self) -> dict:
+        return {"sha256sum": self._hash.hexdigest()}
+
+
+class ByteSize(Measurement):
+    provides = ("byteSize",)
+
+    def __init__(self):
+        self._size = 0
+
+    def update(self, chunk: bytes):
+        self._size += len(chunk)
+
+    def result(self) -> dict:
+        return {"byteSize": self._size}
+
+
+class _Head:
+    """Collects the first bytes of a stream for the magic byte detection"""
+
+    def __init__(self):
+        self.data = b""
+
+    @property
+    def complete(self) -> bool:
+        return len(self.data) >= MAGIC_BYTES_LENGTH
+
+    def update(self, chunk: bytes):
+        if not self.complete:
+            self.data += bytes(chunk[: MAGIC_BYTES_LENGTH - len(self.data)])
+
+
+class Compression(Measurement):
+    provides = ("compression",)
+
+    def __init__(self):
+        self._head = _Head()
+
+    def update(self, chunk: bytes):
+        self._head.update(chunk)
+
+    def result(self) -> dict:
+        return {"compression": detect_compression(self._head.data)}
+
+
+class _ConsumerSink:
+    """File-like target of a zstd stream_writer passing every decompressed piece on to consume"""
+
+    def __init__(self, consume: Callable[[bytes], None]):
+        self._consume = consume
+
+    def write(self, data: bytes) -> int:
+        self._consume(data)
+        return len(data)
+
+
+class _StreamDecompressor:
+    """Incrementally decompresses (multi member) gz, bz2, xz and zst streams with bounded output per step.
+    Every decompressed piece is passed to consume right away instead of being collected."""
+
+    def __init__(self, compression: str, consume: Callable[[bytes], None]):
+        self._consume = consume
+        self._factory = {
+            "gz": lambda: zlib.decompressobj(wbits=31),
+            "bz2": bz2.BZ2Decompressor,
+            "xz": lzma.LZMADecompressor,
+        }.get(compression)
+        self._is_zlib = compression == "gz"
+        self._is_zstd = compression == "zst"
+        if self._is_zstd:
+            # the writer decodes consecutive frames and hands out at most write_size bytes at a time
+            self._decompressor = zstandard.ZstdDecompressor().stream_writer(
+                _ConsumerSink(consume), write_size=MAX_DECOMPRESSED_CHUNK, write_return_read=True
+            )
+        else:
+            self._decompressor = self._factory()
+
+    def feed(self, data: bytes):
+        if self._is_zstd:
+            self._decompressor.write(data)
+        elif self._is_zlib:
+            self._feed_zlib(data)
+        else:
+            self._feed_bz2_lzma(data)
+
+    def _feed_zlib(self, data: bytes):
+        while True:
+            out = self._decompressor.decompress(data, MAX_DECOMPRESSED_CHUNK)
+            self._consume(out)
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = self._factory()
+                if not data:
+                    return
+            else:
+                data = self._decompressor.unconsumed_tail
+                if not data and len(out) < MAX_DECOMPRESSED_CHUNK:
+                    return
+
+    def _feed_bz2_lzma(self, data: bytes):
+        while True:
+            self._consume(self._decompressor.decompress(data, MAX_DECOMPRESSED_CHUNK))
+            data = b""
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = self._factory()
+                if not data:
+                    return
+            elif self._decompressor.needs_input:
+                return
+
+
+class UncompressedStats(Measurement):
+    """Size (and optionally the number of lines) of the decompressed content, computed without storing it.
+    Values are None if the compression of the file cannot be decompressed here."""
+
+    def __init__(self, count_lines: bool = True):
+        self._count_lines = count_lines
+        self.provides = ("uncompressedByteSize", "lineCount") if count_lines else ("uncompressedByteSize",)
+        self._head = _Head()
+        self._pending = b""
+        self._decompressor: Optional[_StreamDecompressor] = None
+        self._supported = True
+        self._size = 0
+        self._lines = 0
+        self._last_byte = b""
+
+    def _consume(self, data: bytes):
+        if not data:
+            return
+        self._size += len(data)
+        if self._count_lines:
+            # chunks of local files are memoryviews, which cannot be searched directly
+            data = bytes(data) if isinstance(data, memoryview) else data
+            self._lines += data.count(b"\n")
+            self._last_byte = data[-1:]
+
+    def update(self, chunk: bytes):
+        if not self._supported:
+            return
+        if not self._head.complete:
+            self._head.update(chunk)
+            self._pending += bytes(chunk)
+            if not self._head.complete:
+                return
+            self._start()
+            chunk, self._pending = self._pending, b""
+        self._process(chunk)
+
+    def _start(self):
+        compression = detect_compression(self._head.data)
+        if compression == "zst" and zstandard is None:
+            self._supported = False
+        elif compression != "none":
+            self._decompressor = _StreamDecompressor(compression, self._consume)
+
+    def _process(self, chunk: bytes):
+        if not self._supported:
+            return
+        if self._decompressor is None:
+            self._consume(chunk)
+        else:
+            self._decompressor.feed(chunk)
+
+    def result(self) -> dict:
+        if not self._head.complete:
+            # file shorter than any magic bytes
+            self._start()
+            self._process(self._pending)
+            self._pending = b""
+        if not self._supported:
+            return dict.fromkeys(self.provides)
+        result = {"uncompressedByteSize": self._size}
+        if self._count_lines:
+            # a last line without trailing newline counts as well
+            result["lineCount"] = self._lines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        return result
+
+
+# measurements run for every file, sha256sum and byteSize are required by the databus
+DEFAULT_MEASUREMENTS: Sequence[Callable[[], Measurement]] = (
+    Sha256Digest,
+    ByteSize,
+    Compression,
+    partial(UncompressedStats, count_lines=False),
+)
+# the defaults plus the line count of the decompressed content, which has to look at every byte of it
+LINE_COUNT_MEASUREMENTS: Sequence[Callable[[], Measurement]] = (Sha256Digest, ByteSize, Compression, UncompressedStats)
+
+
+class DigestPipeline:
+    def __init__(self, measurements: Sequence[Callable[[], Measurement]] = DEFAULT_MEASUREMENTS):
+        """Feeds every chunk of a file to a set of measurements, so all of them are computed in a single pass"""
+        self._measurements = [factory() for factory in measurements]
+
+    @property
+    def provides(self) -> set:
+        return {key for m in self._measurements for key in m.provides}
+
+    def update(self, chunk: bytes):
+        for measurement in self._measurements:
+            measurement.update(chunk)
+
+    def result(self) -> dict:
+        results = {}
+        for measurement in self._measurements:
+            results.update(measurement.result())
+        return results
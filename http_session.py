@@ -0,0 +1,63 @@
+import threading
+from typing import Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# (connect, read) timeout in seconds for every request without an explicit timeout
+DEFAULT_TIMEOUT = (10, 300)
+# number of hosts a connection pool is kept for
+DEFAULT_POOL_CONNECTIONS = 10
+# maximum number of connections kept open per host
+DEFAULT_POOL_MAXSIZE = 16
+
+
+class PooledSession(requests.Session):
+    def __init__(
+        self,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        max_retries: int = 0,
+    ):
+        """Session with per-host keep-alive connection pools, a limit on the connections per host and a default timeout.
+        The session can be shared between threads; if more threads than pool_maxsize talk to the same host, they wait
+        for a free connection."""
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries,
+            pool_block=True,
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_session: Optional[PooledSession] = None
+_session_lock = threading.Lock()
+
+
+def configure(**kwargs) -> PooledSession:
+    """Replaces the shared session by one with the given PooledSession settings"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = PooledSession(**kwargs)
+        return _session
+
+
+def get_session() -> PooledSession:
+    """Returns the session shared by all Databus, OEP and MOSS requests of the scripts"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = PooledSession()
+        return _session
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from cache_store import DEFAULT_CACHE_DIR
+from http_session import get_session
+
+
+REPO_FOLDER = pathlib.Path(__file__).parent
+
+DATABUS_CONTEXT = "https://downloads.dbpedia.org/databus/context.jsonld"
+DATABUS_MOCKUP_CONTEXT = "https://raw.githubusercontent.com/dbpedia/databus-git-mockup/main/dev/context.jsonld"
+
+# contexts with a copy in this repository, they are never fetched
+PINNED_CONTEXTS = {
+    "https://raw.githubusercontent.com/LOD-GEOSS/databus-snippets/master/KS80_example/context.jsonld":
+        REPO_FOLDER / "KS80_example" / "context.jsonld",
+    "https://raw.githubusercontent.com/LOD-GEOSS/databus-snippets/master/oep_metadata/context.jsonld":
+        REPO_FOLDER / "oep_metadata" / "context.jsonld",
+}
+
+
+class ContextError(Exception):
+    """Raised if a JSON-LD context cannot be loaded"""
+
+
+@dataclass(frozen=True)
+class TermDefinition:
+    iri: str
+    type: Optional[str] = None
+
+
+class CompiledContext:
+    def __init__(self, context: dict):
+        """Term map of a parsed @context: every term and compact IRI resolved to its full IRI once"""
+        self.prefixes: Dict[str, str] = {}
+        self.terms: Dict[str, TermDefinition] = {}
+        self.vocab: Optional[str] = context.get("@vocab")
+
+        definitions = {k: v for k, v in context.items() if not k.startswith("@")}
+        # plain string definitions ending with / or # can be used as prefixes
+        for term, definition in definitions.items():
+            if isinstance(definition, str) and definition[-1:] in ("/", "#", ":"):
+                self.prefixes[term] = definition
+        for term, definition in definitions.items():
+            if isinstance(definition, str):
+                self.terms[term] = TermDefinition(self.expand_iri(definition))
+            elif isinstance(definition, dict):
+                iri = definition.get("@id", term)
+                type_ = definition.get("@type")
+                self.terms[term] = TermDefinition(
+                    self.expand_iri(iri),
+                    self.expand_iri(type_) if type_ is not None and not type_.startswith("@") else type_,
+                )
+            elif definition is None:
+                self.terms[term] = TermDefinition("@null")
+
+    def expand_iri(self, value: str) -> str:
+        """Resolves keywords, compact IRIs (prefix:suffix) and @vocab relative terms"""
+        if value.startswith("@"):
+            return value
+        prefix, sep, suffix = value.partition(":")
+        if sep and not suffix.startswith("//") and prefix in self.prefixes:
+            return self.prefixes[prefix] + suffix
+        if sep:
+            return value
+        if self.vocab is not None:
+            return self.vocab + value
+        return value
+
+    def expand_term(self, term: str) -> Optional[str]:
+        """Full IRI of a property or type name, None if the context does not define it"""
+        definition = self.terms.get(term)
+        if definition is not None:
+            return definition.iri
+        expanded = self.expand_iri(term)
+        if expanded != term or ":" in term:
+            return expanded
+        return None
+
+    def is_defined(self, term: str) -> bool:
+        return term.startswith("@") or self.expand_term(term) is not None
+
+
+class ContextRegistry:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, offline: bool = False):
+        """Resolves @context URLs to local documents: pinned copies from this repository first, then the on-disk
+        cache, and only if both miss (and offline is not set) the network, storing the result in the cache.
+        Every context is parsed and compiled once per registry and shared by all documents using it."""
+        self.cache_dir = os.path.join(cache_dir, "contexts")
+        self.offline = offline
+        self.pinned = dict(PINNED_CONTEXTS)
+        self._documents: Dict[str, dict] = {}
+        self._compiled: Dict[str, CompiledContext] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, url: str, path):
+        """Serves the context url from a local file from now on"""
+        with self._lock:
+            self.pinned[url] = pathlib.Path(path)
+            self._documents.pop(url, None)
+            self._compiled.pop(url, None)
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".jsonld")
+
+    def _load(self, url: str) -> dict:
+        if url in self.pinned:
+            with open(self.pinned[url], encoding="utf-8") as context_file:
+                return json.load(context_file)
+
+        cache_path = self._cache_path(url)
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as context_file:
+                return json.load(context_file)
+
+        if self.offline:
+            raise ContextError(f"Context '{url}' is neither pinned nor cached and the registry is offline")
+        resp = get_session().get(url, headers={"Accept": "application/ld+json, application/json"})
+        if resp.status_code != 200:
+            raise ContextError(f"Could not fetch context '{url}': Status {resp.status_code}")
+        document = resp.json()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as context_file:
+            json.dump(document, context_file)
+        return document
+
+    def get_document(self, url: str) -> dict:
+        """The full context document of url"""
+        with self._lock:
+            document = self._documents.get(url)
+            if document is None:
+                document = self._documents[url] = self._load(url)
+            return document
+
+    def _merge(self, context) -> dict:
+        """Merges a @context value (URL, inline dict or list of both) into one dict of definitions"""
+        merged = {}
+        for part in context if isinstance(context, list) else [context]:
+            if isinstance(part, str):
+                part = self._merge(self.get_document(part).get("@context", {}))
+            merged.update(part)
+        return merged
+
+    def get_compiled(self, url: str) -> CompiledContext:
+        """The compiled term map of the @context in the document at url"""
+        compiled = self._compiled.get(url)
+        if compiled is None:
+            compiled = CompiledContext(self._merge(self.get_document(url).get("@context", {})))
+            with self._lock:
+                self._compiled[url] = compiled
+        return compiled
+
+    def compile(self, context) -> CompiledContext:
+        """Compiled term map for the @context value of a document, contexts given by URL are compiled only once"""
+        if isinstance(context, str):
+            return self.get_compiled(context)
+        return CompiledContext(self._merge(context))
+
+    def document_loader(self, url: str, options: Optional[dict] = None) -> dict:
+        """Document loader in the format of pyld (jsonld.set_document_loader), serving contexts from the registry"""
+        return {"contextUrl": None, "documentUrl": url, "document": self.get_document(url)}
+
+
+_registry: Optional[ContextRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ContextRegistry:
+    """The registry shared by all documents of the process"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ContextRegistry()
+        return _registry
@@ -1,21 +1,40 @@
 
+import copy
+import json
 import os
 import pathlib
-import requests
 import datetime as dt
-from bs4 import BeautifulSoup
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from bs4 import BeautifulSoup, SoupStrainer
 
 from oem2orm.oep_oedialect_oem2orm import api_updateMdOnTable
 
 import databusclient
 from databusclient_example import create_distribution  # in future from databusclient
+from deploy_ledger import DeployLedger
+from dev_databus_api_example import DatabusError, DataGroup, deploy_to_databus
+from cache_store import DEFAULT_CACHE_DIR
+from http_session import get_session
 from moss import submit_metadata_to_moss
+from registration_metrics import get_metrics
+from registration_journal import DEPLOYED, MOSS_SUBMITTED, OEP_UPDATED, RegistrationJournal
+from registration_pipeline import DEFAULT_QUEUE_SIZE, Pipeline, Stage, StageFailure
+from registration_state import RegistrationState, data_fingerprint, metadata_digest
+from table_meta_cache import get_table_meta_cache
 
 
 class MetadataError(Exception):
     """Raised if metadata is invalid"""
 
 
+class OepUpdateError(Exception):
+    """Raised if the updated metadata did not arrive on the OEP"""
+
+
 API_KEY = os.environ["DATABUS_API_KEY"]
 ACCOUNT_NAME = os.environ["DATABUS_ACCOUNT_NAME"]
 OEP_TOKEN = os.environ["OEP_TOKEN"]
@@ -52,30 +71,85 @@ SCHEMAS = [
 
 DATABUS_DL_LINK_FILE_FORMAT = "csv"
 
+MAX_CRAWL_WORKERS = 8
+# workers of the registration stages, MOSS and OEP write-backs are slow, so they get as many as the deploys
+PREPARE_WORKERS = 8
+DEPLOY_WORKERS = 4
+OEP_UPDATE_WORKERS = 4
+MOSS_WORKERS = 4
+# the Prometheus textfile and the JSON summary of each run are written here
+METRICS_DIR = os.environ.get("OEP_METRICS_DIR", os.path.join(DEFAULT_CACHE_DIR, "metrics"))
+# lxml is much faster on the large schema pages, html.parser is the fallback
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+# only the tables listing of a schema page is parsed
+TABLES_STRAINER = SoupStrainer(id="tables")
+
+
 def get_tables(schema):
     schema_url = f"{OEP_URL}/dataedit/view/{schema}"
-    html = requests.get(schema_url).content
-    soup = BeautifulSoup(html, features="html.parser")
-    table = soup.find(id="tables")
-    rows = table.find_all("tr")
-    for row in rows:
-        if "onclick" not in row.attrs:
-            continue
+    metrics = get_metrics()
+    with metrics.timed("get_tables"):
+        html = get_session().get(schema_url).content
+        soup = BeautifulSoup(html, features=HTML_PARSER, parse_only=TABLES_STRAINER)
+    metrics.add_bytes("get_tables", len(html))
+    for row in soup.find_all("tr", onclick=True):
         raw_url = row.attrs["onclick"].split("'")[1]
         yield raw_url.split("/")[-1]
 
 
+def get_schema_tables(schemas: Iterable[str] = SCHEMAS, max_workers: int = MAX_CRAWL_WORKERS) -> Iterator[Tuple[str, str]]:
+    """Crawls the schema pages concurrently and yields (schema, table) as soon as the page of a schema is parsed"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # get_tables is a generator, so download and parsing happen when list() consumes it in the worker
+        futures = {executor.submit(list, get_tables(schema)): schema for schema in schemas}
+        for future in as_completed(futures):
+            schema_name = futures[future]
+            for table_name in future.result():
+                yield schema_name, table_name
+
+
 def get_table_meta(schema, table):
-    meta_url = f"{OEP_URL}/api/v0/schema/{schema}/tables/{table}/meta"
-    response = requests.get(meta_url)
-    return response.json()
+    """Metadata of the table, served from the shared table meta cache if it is recent or unchanged on the OEP"""
+    metrics = get_metrics()
+    with metrics.timed("get_table_meta"):
+        lookup = get_table_meta_cache().lookup(schema, table)
+    metrics.add_bytes("get_table_meta", lookup.transferred_bytes)
+    return lookup.metadata
 
 def update_selective_metadata_fields(metadata: dict= None, table: str=None):
     # update oem-key#16 `@id`
     metadata['@id'] = f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{GROUP}/{table}"
     return metadata
 
-def register_oep_table(schema_name, table_name):
+@dataclass
+class TableRegistration:
+    """A table on its way through the registration stages"""
+
+    schema_name: str
+    table_name: str
+    # version date of the databus release, today if not set
+    version: Optional[str] = None
+    metadata: Optional[dict] = None
+    dataset: Optional[dict] = None
+    metadata_digest: Optional[str] = None
+    data_fingerprint: Optional[str] = None
+
+    @property
+    def table_id(self) -> str:
+        return f"{self.schema_name}.{self.table_name}"
+
+
+def prepare_oep_table(
+    registration: TableRegistration,
+    state: Optional[RegistrationState] = None,
+    include_group: bool = True,
+    journal: Optional[RegistrationJournal] = None,
+) -> Optional[TableRegistration]:
+    """Fetches and checks the metadata of the table and creates its dataset, including the group documentation
+    unless include_group is False (the group is deployed separately, see deploy_oep_group).
+    With a state given, returns None for tables whose metadata and data did not change since their last registration.
+    With a journal given, tables already deployed in this run only get their metadata for the remaining stages."""
+    schema_name, table_name = registration.schema_name, registration.table_name
     metadata = get_table_meta(schema_name, table_name)
 
     if len(metadata) == 0:
@@ -88,9 +162,26 @@ def register_oep_table(schema_name, table_name):
     except (IndexError, KeyError) as e:
         raise MetadataError(f"No license found for for table '{schema_name}.{table_name}'.") from e
 
+    if journal is not None and journal.is_done(registration.table_id, DEPLOYED):
+        # resumed run: neither the data fingerprint nor the dataset are needed anymore. Without a fingerprint
+        # the state is not recorded, so the next run compares the table with its previous registration
+        registration.metadata = metadata
+        return registration
+
+    data_url = f"{OEP_URL}/api/v0/schema/{schema_name}/tables/{table_name}/rows?form={DATABUS_DL_LINK_FILE_FORMAT}"
+    if state is not None:
+        # digest of the metadata as written back to the OEP, so the write-back itself is no change
+        registration.metadata_digest = metadata_digest(update_selective_metadata_fields(copy.deepcopy(metadata), table_name))
+        with get_metrics().timed("data_fingerprint"):
+            registration.data_fingerprint = data_fingerprint(data_url)
+        if state.is_unchanged(registration.table_id, registration.metadata_digest, registration.data_fingerprint):
+            print(f"Table '{registration.table_id}' is unchanged since its last registration, skipping")
+            get_metrics().table_finished("unchanged")
+            return None
+
     distributions = [
         create_distribution(
-            url=f"{OEP_URL}/api/v0/schema/{schema_name}/tables/{table_name}/rows?form={DATABUS_DL_LINK_FILE_FORMAT}",
+            url=data_url,
             cvs={"variant": "data"},
             file_format=DATABUS_DL_LINK_FILE_FORMAT
         ),
@@ -101,37 +192,177 @@ def register_oep_table(schema_name, table_name):
         )
     ]
 
-    version_id = f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{GROUP}/{table_name}/{dt.date.today().isoformat()}"
-    dataset = databusclient.createDataset(
+    version = registration.version or dt.date.today().isoformat()
+    version_id = f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{GROUP}/{table_name}/{version}"
+    group_kwargs = dict(
+        group_title=GROUP_TITLE,
+        group_abstract=GROUP_ABSTRACT,
+        group_description=GROUP_DESCRIPTION
+    ) if include_group else {}
+    registration.dataset = databusclient.createDataset(
         version_id,
         title=metadata["title"],
         abstract=abstract,
         description=metadata.get("description", ""),
         license=license_,
         distributions=distributions,
-        group_title=GROUP_TITLE,
-        group_abstract=GROUP_ABSTRACT,
-        group_description=GROUP_DESCRIPTION
+        **group_kwargs
     )
+    registration.metadata = metadata
+    return registration
+
+
+def _run_once(registration: TableRegistration, stage: str, journal: Optional[RegistrationJournal], action: Callable):
+    """Runs action unless the journal has the stage of the table as completed, and records it afterwards.
+    action has to raise if the stage did not succeed, otherwise a failed stage is never redone."""
+    if journal is not None and journal.is_done(registration.table_id, stage):
+        return
+    action()
+    if journal is not None:
+        journal.mark_done(registration.table_id, stage)
+
+
+def _send(operation: str, payload, send: Callable):
+    """Calls send with the JSON payload, recording its duration and size"""
+    metrics = get_metrics()
+    with metrics.timed(operation):
+        send(payload)
+    metrics.add_bytes(operation, len(json.dumps(payload)))
 
-    databusclient.deploy(dataset, API_KEY)
 
+def publish_dataset(dataset: dict):
+    """Publishes the dataset on the databus, raises DatabusError if the databus does not accept it.
+    databusclient.deploy only prints the status, so a rejected deploy would count as done."""
+    resp = get_session().post(
+        f"{DATABUS_URI_BASE}/api/publish",
+        data=json.dumps(dataset),
+        headers={"X-API-KEY": API_KEY, "Content-Type": "application/json"},
+    )
+    if resp.status_code >= 400:
+        print(f"Response: Status {resp.status_code}; Text: {resp.text}")
+        raise DatabusError(f"Could not deploy the dataset, status {resp.status_code}")
+
+
+def deploy_oep_table(registration: TableRegistration, journal: Optional[RegistrationJournal] = None) -> TableRegistration:
+    _run_once(registration, DEPLOYED, journal, lambda: _send("deploy", registration.dataset, publish_dataset))
+    return registration
+
+
+def update_oep_metadata(registration: TableRegistration, journal: Optional[RegistrationJournal] = None) -> TableRegistration:
     # update Metadata on OEP
-    updated_metadata = update_selective_metadata_fields(metadata, table_name)
-    api_updateMdOnTable(updated_metadata, token=OEP_TOKEN)
+    updated_metadata = update_selective_metadata_fields(registration.metadata, registration.table_name)
+
+    def write_back(metadata):
+        api_updateMdOnTable(metadata, token=OEP_TOKEN)
+        cache = get_table_meta_cache()
+        cache.invalidate(registration.schema_name, registration.table_name)
+        # api_updateMdOnTable does not raise on every rejected request, so check the metadata on the OEP
+        if cache.get(registration.schema_name, registration.table_name).get("@id") != metadata["@id"]:
+            raise OepUpdateError(f"Metadata of table '{registration.table_id}' was not updated on the OEP")
 
+    _run_once(registration, OEP_UPDATED, journal, lambda: _send("oep_update", updated_metadata, write_back))
+    return registration
+
+
+def submit_oep_table_to_moss(
+    registration: TableRegistration,
+    state: Optional[RegistrationState] = None,
+    journal: Optional[RegistrationJournal] = None,
+) -> TableRegistration:
     # Get file identifier:
-    databus_identifier =  f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{GROUP}/{table_name}"
-    submit_metadata_to_moss(databus_identifier, metadata)
+    databus_identifier =  f"{DATABUS_URI_BASE}/{ACCOUNT_NAME}/{GROUP}/{registration.table_name}"
+    _run_once(
+        registration,
+        MOSS_SUBMITTED,
+        journal,
+        lambda: _send("moss", registration.metadata, lambda metadata: submit_metadata_to_moss(databus_identifier, metadata)),
+    )
+
+    # without a data fingerprint the table is registered again next time
+    if state is not None and registration.data_fingerprint is not None:
+        state.record(registration.table_id, registration.metadata_digest, registration.data_fingerprint)
+    get_metrics().table_finished("registered")
+    return registration
+
 
+def register_oep_table(schema_name, table_name, state: Optional[RegistrationState] = None) -> bool:
+    """Deploys the table to the databus, writes the updated metadata back to the OEP and submits it to MOSS.
+    With a state given, tables whose metadata and data did not change since their last registration are skipped.
+    Returns False if the table was skipped."""
+    registration = prepare_oep_table(TableRegistration(schema_name, table_name), state=state)
+    if registration is None:
+        return False
+    deploy_oep_table(registration)
+    update_oep_metadata(registration)
+    submit_oep_table_to_moss(registration, state=state)
+    return True
 
-def register_oep_tables():
-    for schema_name in SCHEMAS:
-        for table_name in get_tables(schema_name):
-            try:
-                register_oep_table(schema_name, table_name)
-            except MetadataError as e:
-                print(f"{e}\nSkipping registration for table '{schema_name}.{table_name}'")
+
+def deploy_oep_group(ledger: Optional[DeployLedger] = None) -> bool:
+    """Deploys the documentation of the OEP group, with a ledger only if it changed since its last deploy.
+    Returns whether it was sent."""
+    group = DataGroup(
+        account_name=ACCOUNT_NAME,
+        id=GROUP,
+        title=GROUP_TITLE,
+        abstract=GROUP_ABSTRACT,
+        description=GROUP_DESCRIPTION,
+    )
+    with get_metrics().timed("deploy_group"):
+        return deploy_to_databus(API_KEY, group, ledger=ledger)
+
+
+def report_failure(failure: StageFailure):
+    table_id = failure.item.table_id
+    if isinstance(failure.error, MetadataError):
+        get_metrics().table_finished("invalid")
+        print(f"{failure.error}\nSkipping registration for table '{table_id}'")
+    else:
+        get_metrics().table_finished("failed")
+        print(f"Registration of table '{table_id}' failed in stage '{failure.stage}': {failure.error!r}")
+
+
+def register_oep_tables(
+    queue_size: int = DEFAULT_QUEUE_SIZE, version: Optional[str] = None, metrics_dir: str = METRICS_DIR
+) -> List[StageFailure]:
+    """Registers the tables of all SCHEMAS in a pipeline, so fetching metadata, databus deploys, OEP write-backs and
+    MOSS submits of different tables overlap. Returns the failed tables.
+    Completed stages are journaled per version (today by default), so rerunning after a crash only redoes the
+    missing stages. The group documentation is deployed once up front (if it changed), the tables are deployed as
+    version documents only. Timings and counters of the run are written to metrics_dir as Prometheus textfile and JSON summary."""
+    version = version or dt.date.today().isoformat()
+    metrics = get_metrics()
+    metrics.reset()
+    state = RegistrationState()
+    journal = RegistrationJournal(version)
+    journal.prune()
+    ledger = DeployLedger()
+    stages = [
+        Stage(
+            "prepare",
+            partial(prepare_oep_table, state=state, include_group=False, journal=journal),
+            workers=PREPARE_WORKERS,
+        ),
+        Stage("deploy", partial(deploy_oep_table, journal=journal), workers=DEPLOY_WORKERS),
+        Stage("oep_update", partial(update_oep_metadata, journal=journal), workers=OEP_UPDATE_WORKERS),
+        Stage("moss", partial(submit_oep_table_to_moss, state=state, journal=journal), workers=MOSS_WORKERS),
+    ]
+    try:
+        deploy_oep_group(ledger)
+        tables = (
+            TableRegistration(schema_name, table_name, version=version)
+            for schema_name, table_name in get_schema_tables(SCHEMAS)
+        )
+        return Pipeline(stages, queue_size=queue_size, on_error=report_failure).run(tables)
+    finally:
+        ledger.close()
+        journal.close()
+        state.close()
+        metrics.finish()
+        os.makedirs(metrics_dir, exist_ok=True)
+        metrics.write_prometheus_textfile(os.path.join(metrics_dir, "oep_registration.prom"))
+        metrics.write_json_summary(os.path.join(metrics_dir, "oep_registration_summary.json"))
+        print(f"Registered {metrics.tables.get('registered', 0)} tables ({metrics.tables_per_minute:.1f} tables/min)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Set
+
+from cache_store import DEFAULT_CACHE_DIR, SqliteStore
+
+
+# stages of a table registration recorded in the journal
+DEPLOYED = "deployed"
+OEP_UPDATED = "oep_updated"
+MOSS_SUBMITTED = "moss_submitted"
+
+
+class RegistrationJournal(SqliteStore):
+    def __init__(self, run_id: str, cache_dir: str = DEFAULT_CACHE_DIR):
+        """Durable record of the completed stages of each table in the run run_id (e.g. the version date),
+        so a restarted run only redoes the stages that are missing. The journal can be shared between threads."""
+        self.run_id = run_id
+        super().__init__(
+            "oep_registration_journal.sqlite",
+            "CREATE TABLE IF NOT EXISTS progress ("
+            "run_id TEXT NOT NULL, table_id TEXT NOT NULL, stage TEXT NOT NULL, completed_at TEXT NOT NULL, "
+            "PRIMARY KEY (run_id, table_id, stage))",
+            cache_dir,
+        )
+
+    def completed_stages(self, table_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage FROM progress WHERE run_id = ? AND table_id = ?", (self.run_id, table_id)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def is_done(self, table_id: str, stage: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM progress WHERE run_id = ? AND table_id = ? AND stage = ?",
+                (self.run_id, table_id, stage),
+            ).fetchone()
+        return row is not None
+
+    def mark_done(self, table_id: str, stage: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?)",
+                (self.run_id, table_id, stage, datetime.now().isoformat()),
+            )
+
+    def prune(self):
+        """Removes the progress of all other runs"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM progress WHERE run_id != ?", (self.run_id,))
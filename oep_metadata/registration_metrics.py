@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+METRIC_PREFIX = "oep_registration"
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative_counts(self) -> Iterator[Tuple[float, int]]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, None without observations or in the +Inf bucket"""
+        if self.count == 0:
+            return None
+        for bound, total in self.cumulative_counts():
+            if total >= q * self.count:
+                return bound if bound != math.inf else None
+        return None
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _labels(**labels) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class RegistrationMetrics:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """Timers and counters of a registration run: latency histograms and transferred bytes per operation,
+        errors per operation and error type and the outcome of each table. Can be shared between threads."""
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Starts a new run"""
+        with self._lock:
+            self.started_at = time.time()
+            self.finished_at: Optional[float] = None
+            self.latencies: Dict[str, Histogram] = {}
+            self.bytes: Dict[str, int] = {}
+            self.errors: Dict[Tuple[str, str], int] = {}
+            self.tables: Dict[str, int] = {}
+
+    @contextmanager
+    def timed(self, operation: str):
+        """Records the duration of the block, and its error type if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                key = (operation, type(e).__name__)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                histogram = self.latencies.get(operation)
+                if histogram is None:
+                    histogram = self.latencies[operation] = Histogram(self.buckets)
+                histogram.observe(duration)
+
+    def add_bytes(self, operation: str, size: int):
+        with self._lock:
+            self.bytes[operation] = self.bytes.get(operation, 0) + size
+
+    def table_finished(self, outcome: str):
+        """Counts a table leaving the run, e.g. as registered, unchanged, invalid or failed"""
+        with self._lock:
+            self.tables[outcome] = self.tables.get(outcome, 0) + 1
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    @property
+    def duration(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def tables_per_minute(self) -> float:
+        """Tables registered or found unchanged per minute of the run"""
+        done = self.tables.get("registered", 0) + self.tables.get("unchanged", 0)
+        return done / (self.duration / 60) if self.duration > 0 else 0.0
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": self.duration,
+                "tables": dict(self.tables),
+                "tables_per_minute": self.tables_per_minute,
+                "operations": {
+                    operation: {
+                        "count": histogram.count,
+                        "total_seconds": histogram.sum,
+                        "mean_seconds": histogram.sum / histogram.count,
+                        "p50_seconds": histogram.quantile(0.5),
+                        "p95_seconds": histogram.quantile(0.95),
+                        "bytes": self.bytes.get(operation, 0),
+                    }
+                    for operation, histogram in self.latencies.items()
+                },
+                "errors": [
+                    {"operation": operation, "error_type": error_type, "count": count}
+                    for (operation, error_type), count in self.errors.items()
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_operation_seconds Latency of the registration operations",
+            f"# TYPE {p}_operation_seconds histogram",
+        ]
+        with self._lock:
+            for operation, histogram in self.latencies.items():
+                for bound, total in histogram.cumulative_counts():
+                    lines.append(f"{p}_operation_seconds_bucket{_labels(operation=operation, le=_format_bound(bound))} {total}")
+                lines.append(f"{p}_operation_seconds_sum{_labels(operation=operation)} {histogram.sum}")
+                lines.append(f"{p}_operation_seconds_count{_labels(operation=operation)} {histogram.count}")
+
+            lines += [f"# HELP {p}_bytes_total Bytes transferred per operation", f"# TYPE {p}_bytes_total counter"]
+            lines += [f"{p}_bytes_total{_labels(operation=op)} {size}" for op, size in self.bytes.items()]
+
+            lines += [f"# HELP {p}_errors_total Failed operations per error type", f"# TYPE {p}_errors_total counter"]
+            lines += [
+                f"{p}_errors_total{_labels(operation=op, error_type=error_type)} {count}"
+                for (op, error_type), count in self.errors.items()
+            ]
+
+            lines += [f"# HELP {p}_tables_total Tables per outcome", f"# TYPE {p}_tables_total counter"]
+            lines += [f"{p}_tables_total{_labels(outcome=outcome)} {count}" for outcome, count in self.tables.items()]
+
+            lines += [
+                f"# HELP {p}_tables_per_minute Tables registered or found unchanged per minute",
+                f"# TYPE {p}_tables_per_minute gauge",
+                f"{p}_tables_per_minute {self.tables_per_minute}",
+                f"# HELP {p}_duration_seconds Duration of the run",
+                f"# TYPE {p}_duration_seconds gauge",
+                f"{p}_duration_seconds {self.duration}",
+                f"# HELP {p}_started_timestamp_seconds Start of the run",
+                f"# TYPE {p}_started_timestamp_seconds gauge",
+                f"{p}_started_timestamp_seconds {self.started_at}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_textfile(self, path: str):
+        """Writes the metrics for the textfile collector of the node exporter, atomically so it never reads a partial file"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as textfile:
+            textfile.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def write_json_summary(self, path: str):
+        with open(path, "w", encoding="utf-8") as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+
+
+_metrics = RegistrationMetrics()
+
+
+def get_metrics() -> RegistrationMetrics:
+    """The metrics shared by all registration functions of the process"""
+    return _metrics
@@ -0,0 +1,110 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+
+DEFAULT_QUEUE_SIZE = 16
+
+# marks the end of the items in a stage queue
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """Step of a pipeline: func is called with each item and returns the item for the next stage,
+    or None to drop it (e.g. because there is nothing left to do)"""
+
+    name: str
+    func: Callable
+    workers: int = 1
+
+
+@dataclass
+class StageFailure:
+    stage: str
+    item: object
+    error: Exception
+
+
+class Pipeline:
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_error: Optional[Callable[[StageFailure], None]] = None,
+    ):
+        """Runs items through the stages, every stage with its own worker threads. Stages are linked by bounded
+        queues, so a slow stage throttles the stages before it instead of piling up items in memory.
+        An exception drops the item from the pipeline and is passed to on_error, the other items continue."""
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.failures: List[StageFailure] = []
+        self._failures_lock = threading.Lock()
+
+    def _fail(self, failure: StageFailure):
+        with self._failures_lock:
+            self.failures.append(failure)
+        if self.on_error is not None:
+            self.on_error(failure)
+
+    def _worker(self, stage: Stage, in_queue: queue.Queue, out_queue: Optional[queue.Queue], done: "_StageDone"):
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                break
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                self._fail(StageFailure(stage.name, item, e))
+                continue
+            if result is not None and out_queue is not None:
+                out_queue.put(result)
+        done.worker_finished()
+
+    def run(self, items: Iterable) -> List[StageFailure]:
+        """Feeds items into the first stage and blocks until every item left the pipeline.
+        Returns the failures of all stages."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            if i + 1 < len(self.stages):
+                out_queue, next_workers = queues[i + 1], self.stages[i + 1].workers
+            else:
+                out_queue, next_workers = None, 0
+            done = _StageDone(stage.workers, out_queue, next_workers)
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage, queues[i], out_queue, done), name=f"{stage.name}-{n}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+        return self.failures
+
+
+class _StageDone:
+    """Counts the finished workers of a stage, the last one closes the queue of the next stage"""
+
+    def __init__(self, workers: int, out_queue: Optional[queue.Queue], next_workers: int):
+        self.remaining = workers
+        self.out_queue = out_queue
+        self.next_workers = next_workers
+        self._lock = threading.Lock()
+
+    def worker_finished(self):
+        with self._lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last and self.out_queue is not None:
+            for _ in range(self.next_workers):
+                self.out_queue.put(_DONE)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import requests
+
+from cache_store import DEFAULT_CACHE_DIR, SqliteStore
+from http_session import get_session
+
+
+CHUNK_SIZE = 1024 * 1024
+# answers of servers without HEAD support, the fingerprint then falls back to a GET
+HEAD_NOT_SUPPORTED = (405, 501)
+
+
+def metadata_digest(metadata: dict) -> str:
+    """sha256 of the metadata with sorted keys"""
+    canonical = json.dumps(metadata, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _validator_fingerprint(headers) -> Optional[str]:
+    if "ETag" in headers:
+        return f"etag:{headers['ETag']}"
+    if "Last-Modified" in headers:
+        return f"last-modified:{headers['Last-Modified']}"
+    return None
+
+
+def data_fingerprint(url: str) -> Optional[str]:
+    """Fingerprint of the data behind url: its ETag or Last-Modified header if the server sends one (asked with a
+    HEAD first, so the data is only downloaded without them), otherwise the sha256 of the streamed content.
+    None if the data could not be fetched, which counts as changed."""
+    session = get_session()
+    try:
+        head = session.head(url, allow_redirects=True)
+        if head.ok:
+            fingerprint = _validator_fingerprint(head.headers)
+            if fingerprint is not None:
+                return fingerprint
+        elif head.status_code not in HEAD_NOT_SUPPORTED:
+            return None
+        with session.get(url, stream=True) as resp:
+            if not resp.ok:
+                return None
+            fingerprint = _validator_fingerprint(resp.headers)
+            if fingerprint is not None:
+                return fingerprint
+            sha256 = hashlib.sha256()
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                sha256.update(chunk)
+            return f"sha256:{sha256.hexdigest()}"
+    except requests.RequestException:
+        return None
+
+
+@dataclass
+class TableState:
+    metadata_digest: str
+    data_fingerprint: str
+    registered_at: str
+
+
+class RegistrationState(SqliteStore):
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        """On-disk record of the metadata digest and data fingerprint of the last successful registration
+        of each OEP table ("schema.table"). The state can be shared between threads."""
+        super().__init__(
+            "oep_registration_state.sqlite",
+            "CREATE TABLE IF NOT EXISTS registrations ("
+            "table_id TEXT PRIMARY KEY, metadata_digest TEXT NOT NULL, data_fingerprint TEXT NOT NULL, "
+            "registered_at TEXT NOT NULL)",
+            cache_dir,
+        )
+
+    def get(self, table_id: str) -> Optional[TableState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata_digest, data_fingerprint, registered_at FROM registrations WHERE table_id = ?",
+                (table_id,),
+            ).fetchone()
+        return TableState(*row) if row is not None else None
+
+    def is_unchanged(self, table_id: str, metadata_digest: str, data_fingerprint: Optional[str]) -> bool:
+        """True if metadata and data are the same as at the last successful registration of the table,
+        never for an unknown data fingerprint"""
+        if data_fingerprint is None:
+            return False
+        state = self.get(table_id)
+        return (
+            state is not None
+            and state.metadata_digest == metadata_digest
+            and state.data_fingerprint == data_fingerprint
+        )
+
+    def record(self, table_id: str, metadata_digest: str, data_fingerprint: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO registrations VALUES (?, ?, ?, ?)",
+                (table_id, metadata_digest, data_fingerprint, datetime.now().isoformat()),
+            )
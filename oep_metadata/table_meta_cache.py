@@ -0,0 +1,143 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from cache_store import DEFAULT_CACHE_DIR, SqliteStore, conditional_headers
+from http_session import get_session
+
+
+DEFAULT_OEP_URL = "https://openenergy-platform.org"
+# metadata younger than this is used without asking the OEP
+DEFAULT_TTL = 3600
+DEFAULT_MEMORY_ENTRIES = 1024
+
+
+@dataclass
+class CachedTableMeta:
+    """Metadata of an OEP table together with the validators it was fetched with"""
+
+    metadata: dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> dict:
+        """Returns the headers for a conditional GET revalidating this entry"""
+        return conditional_headers(self.etag, self.last_modified)
+
+
+@dataclass
+class MetaLookup:
+    metadata: dict
+    # where the metadata came from: memory, disk, revalidated (304) or fetched
+    source: str
+    transferred_bytes: int = 0
+
+
+class TableMetaCache(SqliteStore):
+    def __init__(
+        self,
+        oep_url: str = DEFAULT_OEP_URL,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_TTL,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        """Cache of the /meta endpoint of OEP tables keyed by "schema.table", with an LRU tier in memory and a
+        sqlite tier on disk. Entries younger than ttl seconds are used as they are, older ones are revalidated with
+        their ETag / Last-Modified and only downloaded again if they changed. The cache can be shared between threads."""
+        self.oep_url = oep_url.rstrip("/")
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, CachedTableMeta]" = OrderedDict()
+        super().__init__(
+            "oep_table_meta.sqlite",
+            "CREATE TABLE IF NOT EXISTS table_meta ("
+            "table_id TEXT PRIMARY KEY, metadata TEXT NOT NULL, etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)",
+            cache_dir,
+        )
+
+    def _remember(self, table_id: str, entry: CachedTableMeta):
+        with self._lock:
+            self._memory[table_id] = entry
+            self._memory.move_to_end(table_id)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, table_id: str) -> Tuple[Optional[CachedTableMeta], str]:
+        """The entry of the table and the tier it was found in"""
+        with self._lock:
+            entry = self._memory.get(table_id)
+            if entry is not None:
+                self._memory.move_to_end(table_id)
+                return entry, "memory"
+            row = self._conn.execute(
+                "SELECT metadata, etag, last_modified, fetched_at FROM table_meta WHERE table_id = ?", (table_id,)
+            ).fetchone()
+        if row is None:
+            return None, "none"
+        entry = CachedTableMeta(json.loads(row[0]), row[1], row[2], row[3])
+        self._remember(table_id, entry)
+        return entry, "disk"
+
+    def _store(self, table_id: str, entry: CachedTableMeta):
+        self._remember(table_id, entry)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO table_meta VALUES (?, ?, ?, ?, ?)",
+                (table_id, json.dumps(entry.metadata), entry.etag, entry.last_modified, entry.fetched_at),
+            )
+
+    def lookup(self, schema: str, table: str) -> MetaLookup:
+        """Metadata of the table (a copy, so it can be modified) and how it was obtained"""
+        table_id = f"{schema}.{table}"
+        entry, tier = self._load(table_id)
+        if entry is not None and entry.is_fresh(self.ttl):
+            return MetaLookup(copy.deepcopy(entry.metadata), tier)
+
+        meta_url = f"{self.oep_url}/api/v0/schema/{schema}/tables/{table}/meta"
+        headers = entry.conditional_headers() if entry is not None else {}
+        response = get_session().get(meta_url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            entry = CachedTableMeta(entry.metadata, entry.etag, entry.last_modified, time.time())
+            self._store(table_id, entry)
+            return MetaLookup(copy.deepcopy(entry.metadata), "revalidated")
+
+        metadata = response.json()
+        if response.status_code == 200:
+            self._store(
+                table_id,
+                CachedTableMeta(
+                    metadata, response.headers.get("ETag"), response.headers.get("Last-Modified"), time.time()
+                ),
+            )
+        return MetaLookup(copy.deepcopy(metadata), "fetched", len(response.content))
+
+    def get(self, schema: str, table: str) -> dict:
+        return self.lookup(schema, table).metadata
+
+    def invalidate(self, schema: str, table: str):
+        """Drops the entry of the table, e.g. after its metadata was changed on the OEP"""
+        table_id = f"{schema}.{table}"
+        with self._lock, self._conn:
+            self._memory.pop(table_id, None)
+            self._conn.execute("DELETE FROM table_meta WHERE table_id = ?", (table_id,))
+
+
+_cache: Optional[TableMetaCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_table_meta_cache() -> TableMetaCache:
+    """The cache shared by all consumers of table metadata in the process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TableMetaCache()
+        return _cache
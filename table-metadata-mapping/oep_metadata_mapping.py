@@ -9,6 +9,9 @@ from SPARQLWrapper import SPARQLWrapper, JSON
 
 # A stable identifier for the complete oeo on archivo
 
+# keep-alive session shared by all requests of this script
+session = requests.Session()
+
 
 @dataclass
 class ColumnInfo:
@@ -23,7 +26,7 @@ class ColumnInfo:
 
 def fetch_data(uri: str):
     """Loads a json file"""
-    res = requests.get(uri)
+    res = session.get(uri, timeout=(10, 300))
     return res.json()
 
 